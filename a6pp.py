@@ -3,6 +3,7 @@ import re
 import time
 import os
 from pathlib import Path
+from static_assets import get_static_css_tag
 
 # -----------------------
 # Page Configuration
@@ -17,139 +18,10 @@ st.set_page_config(
 # -----------------------
 # Custom CSS
 # -----------------------
-st.markdown("""
-<style>
-    :root {
-        --primary-color: #6366f1;
-        --secondary-color: #8b5cf6;
-        --background-dark: #0f172a;
-        --background-light: #1e293b;
-        --text-primary: #f1f5f9;
-        --text-secondary: #94a3b8;
-        --accent: #f59e0b;
-    }
-    
-    .stApp {
-        background: linear-gradient(135deg, #0f172a 0%, #1e293b 100%);
-    }
-    
-    .main-header {
-        text-align: center;
-        padding: 2rem 0;
-        background: linear-gradient(135deg, var(--primary-color), var(--secondary-color));
-        border-radius: 1rem;
-        margin-bottom: 2rem;
-        box-shadow: 0 10px 40px rgba(99, 102, 241, 0.3);
-    }
-    
-    .main-header h1 {
-        color: white;
-        font-size: 3rem;
-        font-weight: 800;
-        margin: 0;
-        text-shadow: 2px 2px 4px rgba(0,0,0,0.3);
-    }
-    
-    .main-header p {
-        color: rgba(255,255,255,0.9);
-        font-size: 1.2rem;
-        margin-top: 0.5rem;
-    }
-    
-    .slideshow-container {
-        position: relative;
-        max-width: 100%;
-        height: 85vh;
-        margin: 0 auto;
-        background: rgba(30, 41, 59, 0.6);
-        border-radius: 1.5rem;
-        padding: 2rem;
-        box-shadow: 0 20px 60px rgba(0,0,0,0.5);
-        backdrop-filter: blur(10px);
-        border: 1px solid rgba(99, 102, 241, 0.2);
-        display: flex;
-        flex-direction: column;
-        justify-content: center;
-        align-items: center;
-    }
-    
-    .image-frame {
-        position: relative;
-        width: 100%;
-        height: 100%;
-        background: #000;
-        border-radius: 1rem;
-        overflow: hidden;
-        box-shadow: 0 15px 50px rgba(0, 0, 0, 0.7);
-        border: 8px solid rgba(99, 102, 241, 0.3);
-        display: flex;
-        align-items: center;
-        justify-content: center;
-    }
-    
-    .image-frame img {
-        max-width: 100%;
-        max-height: 100%;
-        width: auto;
-        height: auto;
-        object-fit: contain;
-    }
-    
-    .image-caption {
-        text-align: center;
-        font-size: 1.3rem;
-        font-weight: 600;
-        color: var(--text-primary);
-        margin-top: 1.5rem;
-        padding: 1rem 2rem;
-        background: linear-gradient(135deg, rgba(99, 102, 241, 0.15), rgba(139, 92, 246, 0.15));
-        border-radius: 0.75rem;
-        border: 1px solid rgba(99, 102, 241, 0.3);
-    }
-    
-    .slide-counter {
-        display: inline-block;
-        background: linear-gradient(135deg, var(--primary-color), var(--secondary-color));
-        color: white;
-        padding: 0.4rem 1rem;
-        border-radius: 2rem;
-        font-size: 0.9rem;
-        font-weight: 700;
-        letter-spacing: 0.5px;
-        margin-right: 1rem;
-    }
-    
-    .progress-container {
-        width: 100%;
-        height: 8px;
-        background: rgba(255,255,255,0.1);
-        border-radius: 4px;
-        overflow: hidden;
-        margin: 1rem 0;
-        box-shadow: inset 0 2px 4px rgba(0,0,0,0.3);
-    }
-    
-    .progress-bar {
-        height: 100%;
-        background: linear-gradient(90deg, var(--primary-color), var(--accent));
-        border-radius: 4px;
-        transition: width 0.3s ease;
-        box-shadow: 0 0 15px rgba(99, 102, 241, 0.6);
-    }
-    
-    .stButton > button {
-        border-radius: 0.75rem;
-        font-weight: 600;
-        transition: all 0.3s ease;
-        border: 1px solid rgba(99, 102, 241, 0.3);
-    }
-    
-    .stButton > button:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 5px 20px rgba(99, 102, 241, 0.4);
-    }
-</style>
-""", unsafe_allow_html=True)
+# Linked from ./static so the stylesheet isn't re-sent on every autoplay tick
+CSS_PATH = Path(__file__).parent / "static" / "fullscreen.css"
+
+st.markdown(get_static_css_tag(str(CSS_PATH)), unsafe_allow_html=True)
 
 FOLDER_ID = "1LfSwuD7WxbS0ZdDeGo0hpiviUx6vMhqs"
 FOLDER_URL = f"https://drive.google.com/drive/folders/{FOLDER_ID}?usp=sharing"
@@ -217,6 +89,7 @@ with st.sidebar:
                 st.session_state.file_ids = file_ids
                 st.session_state.current_index = 0
                 st.session_state.autoplay = True
+                st.session_state.slide_shown_at = 0
                 st.success(f"✅ Loaded {len(file_ids)} images!")
                 st.rerun()
             else:
@@ -224,9 +97,28 @@ with st.sidebar:
         else:
             st.warning("⚠️ Please paste file IDs first")
 
-if st.session_state.file_ids:
+def go_to_slide(index: int):
+    """Callback: jump to a slide, wrapping around"""
+    st.session_state.current_index = index % len(st.session_state.file_ids)
+    st.session_state.slide_shown_at = time.time()
+
+def toggle_autoplay():
+    """Callback: play/pause (the full rerun it triggers restarts the fragment timer)"""
+    st.session_state.autoplay = not st.session_state.autoplay
+    st.session_state.slide_shown_at = time.time()
+
+# Autoplay ticks rerun only this fragment, so each slide change sends just the
+# progress bar, image and caption instead of the whole page
+@st.fragment(run_every=st.session_state.slideshow_speed if st.session_state.autoplay else None)
+def slide_view():
     file_ids = st.session_state.file_ids
     total = len(file_ids)
+    
+    # Auto-advance with configured speed (timer ticks only, not the first draw)
+    shown_at = st.session_state.get("slide_shown_at", 0)
+    if st.session_state.autoplay and shown_at and time.time() - shown_at >= st.session_state.slideshow_speed - 0.25:
+        st.session_state.current_index = (st.session_state.current_index + 1) % total
+    
     idx = st.session_state.current_index
     current_file_id = file_ids[idx]
     
@@ -255,40 +147,32 @@ if st.session_state.file_ids:
     </div>
     """, unsafe_allow_html=True)
     
+    st.session_state.slide_shown_at = time.time()
+
+if st.session_state.file_ids:
+    total = len(st.session_state.file_ids)
+    
+    slide_view()
+    
     # Controls
     st.markdown("### 🎮 Controls")
     col1, col2, col3, col4, col5 = st.columns(5)
     
     with col1:
-        if st.button("⏮️ First", use_container_width=True):
-            st.session_state.current_index = 0
-            st.rerun()
+        st.button("⏮️ First", use_container_width=True, on_click=go_to_slide, args=(0,))
     
     with col2:
-        if st.button("⬅️ Prev", use_container_width=True):
-            st.session_state.current_index = (idx - 1) % total
-            st.rerun()
+        st.button("⬅️ Prev", use_container_width=True, on_click=lambda: go_to_slide(st.session_state.current_index - 1))
     
     with col3:
-        if st.button("⏸️ Pause" if st.session_state.autoplay else "▶️ Play", use_container_width=True, type="primary"):
-            st.session_state.autoplay = not st.session_state.autoplay
-            st.rerun()
+        st.button("⏸️ Pause" if st.session_state.autoplay else "▶️ Play", use_container_width=True, type="primary",
+                  on_click=toggle_autoplay)
     
     with col4:
-        if st.button("➡️ Next", use_container_width=True):
-            st.session_state.current_index = (idx + 1) % total
-            st.rerun()
+        st.button("➡️ Next", use_container_width=True, on_click=lambda: go_to_slide(st.session_state.current_index + 1))
     
     with col5:
-        if st.button("⏭️ Last", use_container_width=True):
-            st.session_state.current_index = total - 1
-            st.rerun()
-    
-    # Auto-advance with configured speed
-    if st.session_state.autoplay:
-        time.sleep(st.session_state.slideshow_speed)
-        st.session_state.current_index = (idx + 1) % total
-        st.rerun()
+        st.button("⏭️ Last", use_container_width=True, on_click=go_to_slide, args=(total - 1,))
 
 else:
     st.markdown("""
@@ -4,6 +4,12 @@ import time
 import os
 from pathlib import Path
 import requests
+from html import escape as html_escape
+from drive_api import (
+    DRIVE_API_BASE_URL, DRIVE_API_FULL_SYNC_SECONDS, drive_api_headers, drive_file_to_item, update_drive_manifest
+)
+from decode_worker import is_heavy_image, open_image, register_heif_plugin, render_display, serve_decode_jobs
+from static_assets import get_static_css_tag
 
 # -----------------------
 # Page Configuration
@@ -16,300 +22,2376 @@ st.set_page_config(
 )
 
 # -----------------------
-# Custom CSS Theme
+# Profiling Mode
 # -----------------------
-st.markdown("""
-<style>
-    /* Main theme colors */
-    :root {
-        --primary-color: #6366f1;
-        --secondary-color: #8b5cf6;
-        --background-dark: #0f172a;
-        --background-light: #1e293b;
-        --text-primary: #f1f5f9;
-        --text-secondary: #94a3b8;
-        --accent: #f59e0b;
-    }
-    
-    /* Global styles */
-    .stApp {
-        background: linear-gradient(135deg, #0f172a 0%, #1e293b 100%);
-    }
-    
-    /* Header styling */
-    .main-header {
-        text-align: center;
-        padding: 2rem 0;
-        background: linear-gradient(135deg, var(--primary-color), var(--secondary-color));
-        border-radius: 1rem;
-        margin-bottom: 2rem;
-        box-shadow: 0 10px 40px rgba(99, 102, 241, 0.3);
-    }
-    
-    .main-header h1 {
-        color: white;
-        font-size: 3rem;
-        font-weight: 800;
-        margin: 0;
-        text-shadow: 2px 2px 4px rgba(0,0,0,0.3);
-    }
-    
-    .main-header p {
-        color: rgba(255,255,255,0.9);
-        font-size: 1.2rem;
-        margin-top: 0.5rem;
-    }
-    
-    /* Enhanced slideshow container with centered frame layout */
-    .slideshow-container {
-        position: relative;
-        max-width: 1400px;
-        margin: 2rem auto;
-        background: rgba(30, 41, 59, 0.6);
-        border-radius: 1.5rem;
-        padding: 3rem;
-        box-shadow: 0 20px 60px rgba(0,0,0,0.5);
-        backdrop-filter: blur(10px);
-        border: 1px solid rgba(99, 102, 241, 0.2);
-    }
-    
-    /* Image frame with perfect centering */
-    .image-frame {
-        position: relative;
-        width: 100%;
-        max-width: 1200px;
-        margin: 0 auto;
-        background: #000;
-        border-radius: 1rem;
-        overflow: hidden;
-        box-shadow: 0 15px 50px rgba(0, 0, 0, 0.7);
-        border: 8px solid rgba(99, 102, 241, 0.3);
-    }
-    
-    .image-frame img {
-        display: block;
-        width: 100%;
-        height: auto;
-        max-height: 70vh;
-        object-fit: contain;
-        background: #000;
-    }
-    
-    /* Enhanced caption with slide counter */
-    .image-caption {
-        text-align: center;
-        font-size: 1.3rem;
-        font-weight: 600;
-        color: var(--text-primary);
-        margin-top: 2rem;
-        padding: 1.2rem 2rem;
-        background: linear-gradient(135deg, rgba(99, 102, 241, 0.15), rgba(139, 92, 246, 0.15));
-        border-radius: 0.75rem;
-        border: 1px solid rgba(99, 102, 241, 0.3);
-        display: flex;
-        align-items: center;
-        justify-content: center;
-        gap: 1rem;
-    }
-    
-    .slide-counter {
-        display: inline-block;
-        background: linear-gradient(135deg, var(--primary-color), var(--secondary-color));
-        color: white;
-        padding: 0.4rem 1rem;
-        border-radius: 2rem;
-        font-size: 0.9rem;
-        font-weight: 700;
-        letter-spacing: 0.5px;
-    }
-    
-    /* Progress bar */
-    .progress-container {
-        width: 100%;
-        height: 8px;
-        background: rgba(255,255,255,0.1);
-        border-radius: 4px;
-        overflow: hidden;
-        margin: 1.5rem 0;
-        box-shadow: inset 0 2px 4px rgba(0,0,0,0.3);
-    }
-    
-    .progress-bar {
-        height: 100%;
-        background: linear-gradient(90deg, var(--primary-color), var(--accent));
-        border-radius: 4px;
-        transition: width 0.3s ease;
-        box-shadow: 0 0 15px rgba(99, 102, 241, 0.6);
-    }
-    
-    /* Info cards */
-    .info-card {
-        background: var(--background-light);
-        padding: 1.5rem;
-        border-radius: 1rem;
-        border-left: 4px solid var(--primary-color);
-        margin: 1rem 0;
-        box-shadow: 0 5px 15px rgba(0,0,0,0.3);
+# Opt in with SLIDES_PROFILE=1 or the sidebar toggle. Each rerun appends wall time,
+# allocation deltas and bytes sent to the browser to PROFILE_DIR/reruns.jsonl; every PROFILE_SNAPSHOT_EVERY
+# reruns a tracemalloc snapshot is diffed by source line against the previous one,
+# and cProfile can be sampled for a fixed number of reruns. tracemalloc is
+# process-wide, so it runs only while some session still has profiling on.
+PROFILE_DIR = Path(os.environ.get("PROFILE_DIR", ".profile"))
+PROFILE_SNAPSHOT_EVERY = int(os.environ.get("PROFILE_SNAPSHOT_EVERY", "25"))
+PROFILE_TOP_LINES = 30
+# Profiling sessions that haven't rerun for this long no longer keep tracemalloc on
+PROFILE_IDLE_SECONDS = 300
+
+@st.cache_resource
+def get_profiler_state():
+    """Process-wide profiler state shared by every session"""
+    import threading
+
+    return {
+        "lock": threading.Lock(),
+        "reruns": 0,
+        "sessions": {},
+        "last_snapshot": None,
+        "cprofile": None,
+        "cprofile_owner": None,
+        "cprofile_remaining": 0,
     }
+
+def profiling_enabled():
+    """Profiling is on if the sidebar toggle is set or SLIDES_PROFILE is truthy"""
+    default = os.environ.get("SLIDES_PROFILE", "").lower() in ("1", "true", "yes")
+    return st.session_state.get("profiling_enabled", default)
+
+def get_streamlit_memory_stats():
+    """Bytes held by Streamlit's own caches (media files, session state, ...) by category"""
+    totals = {}
+    try:
+        from streamlit import runtime
+        if not runtime.exists():
+            return totals
+        stats = runtime.get_instance().stats_mgr.get_stats()
+        if isinstance(stats, dict):
+            stats = [stat for family in stats.values() for stat in family]
+        for stat in stats:
+            name = getattr(stat, "category_name", "other")
+            totals[name] = totals.get(name, 0) + getattr(stat, "byte_length", 0)
+    except Exception:
+        pass
+    return totals
+
+def write_tracemalloc_report(state: dict, rerun_number: int):
+    """Snapshot the heap and write the top growth by source line since the last snapshot"""
+    import tracemalloc
+
+    if not tracemalloc.is_tracing():
+        # Stopped by another session since this rerun started
+        return
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    ))
+    previous = state["last_snapshot"]
+    state["last_snapshot"] = snapshot
+
+    lines = [f"# tracemalloc snapshot after rerun {rerun_number} ({time.strftime('%Y-%m-%d %H:%M:%S')})"]
+    if previous is None:
+        lines.append("# first snapshot: top allocations by line")
+        stats = snapshot.statistics("lineno")
+    else:
+        lines.append("# growth since previous snapshot by line")
+        stats = snapshot.compare_to(previous, "lineno")
+    lines.extend(str(stat) for stat in stats[:PROFILE_TOP_LINES])
+
+    lines.append("# streamlit caches (bytes)")
+    for name, size in sorted(get_streamlit_memory_stats().items(), key=lambda kv: -kv[1]):
+        lines.append(f"{name}: {size}")
+
+    with open(PROFILE_DIR / f"tracemalloc-{rerun_number:06d}.txt", "w", encoding="utf-8") as fh:
+        fh.write("\n".join(lines) + "\n")
+
+def start_cprofile(reruns: int):
+    """Sample cProfile over the next N reruns of this session"""
+    state = get_profiler_state()
+    with state["lock"]:
+        if state["cprofile_owner"] is None:
+            state["cprofile_owner"] = get_profile_session_id()
+            state["cprofile_remaining"] = reruns
+            return True
+    return False
+
+def get_profile_session_id():
+    """Session ID of the current script run (empty outside a Streamlit run)"""
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else ""
+
+def track_profiling_session(enabled: bool):
+    """Record whether this session profiles; tracemalloc runs only while any session does"""
+    import tracemalloc
+
+    state = get_profiler_state()
+    if not enabled and not state["sessions"]:
+        return
+    now = time.time()
+    with state["lock"]:
+        sessions = state["sessions"]
+        if enabled:
+            sessions[get_profile_session_id()] = now
+        else:
+            sessions.pop(get_profile_session_id(), None)
+        for sid in [sid for sid, seen in sessions.items() if now - seen > PROFILE_IDLE_SECONDS]:
+            del sessions[sid]
+        if state["cprofile_owner"] is not None and state["cprofile_owner"] not in sessions:
+            # Owner turned profiling off or went away mid-sample; free cProfile for others
+            state["cprofile"] = None
+            state["cprofile_owner"] = None
+            state["cprofile_remaining"] = 0
+
+        if sessions and not tracemalloc.is_tracing():
+            tracemalloc.start(int(os.environ.get("PROFILE_TRACEMALLOC_FRAMES", "1")))
+        elif not sessions and tracemalloc.is_tracing():
+            tracemalloc.stop()
+            state["last_snapshot"] = None
+
+def start_rerun_profile():
+    """Begin measuring this rerun if profiling is enabled"""
+    import tracemalloc
+
+    st.session_state.profile_run = None
+    track_profiling_session(profiling_enabled())
+    if not profiling_enabled():
+        return
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+
+    state = get_profiler_state()
+    run = {"started": time.perf_counter(), "allocated": tracemalloc.get_traced_memory()[0]}
+    # cProfile hooks the thread that enables it, so only the owning session samples
+    with state["lock"]:
+        if state["cprofile_owner"] == get_profile_session_id() and state["cprofile_remaining"] > 0:
+            import cProfile
+
+            if state["cprofile"] is None:
+                state["cprofile"] = cProfile.Profile()
+            run["cprofile"] = state["cprofile"]
+    if run.get("cprofile"):
+        run["cprofile"].enable()
+    start_payload_count(run)
+    st.session_state.profile_run = run
+
+def start_payload_count(run: dict):
+    """
+    Count the serialized size of every ForwardMsg this run sends to the browser,
+    i.e. the WebSocket payload (before compression) attributable to the rerun.
+    """
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        return
+    # Unwrap a counter left behind by a run that never finished
+    send = getattr(ctx._enqueue, "__wrapped__", ctx._enqueue)
+    run["ws_bytes"] = 0
+    run["ws_messages"] = 0
+
+    def counting_send(msg):
+        run["ws_bytes"] += msg.ByteSize()
+        run["ws_messages"] += 1
+        send(msg)
+
+    counting_send.__wrapped__ = send
+    ctx._enqueue = counting_send
+    run["payload_ctx"] = ctx
+
+def stop_payload_count(run: dict):
+    """Restore the context's original send function"""
+    ctx = run.get("payload_ctx")
+    if ctx is not None:
+        ctx._enqueue = getattr(ctx._enqueue, "__wrapped__", ctx._enqueue)
+
+def finish_rerun_profile():
+    """Record the current rerun (safe to call more than once per run)"""
+    import json
+    import tracemalloc
+
+    run = st.session_state.get("profile_run")
+    if not run:
+        return
+    st.session_state.profile_run = None
+
+    stop_payload_count(run)
+    state = get_profiler_state()
+    wall = time.perf_counter() - run["started"]
+    current, peak = tracemalloc.get_traced_memory()
+
+    if run.get("cprofile"):
+        profiler = run["cprofile"]
+        profiler.disable()
+        with state["lock"]:
+            # The sample may have been released (and the slot retaken) while this run was going
+            finished = False
+            if state["cprofile"] is profiler:
+                state["cprofile_remaining"] -= 1
+                finished = state["cprofile_remaining"] <= 0
+                if finished:
+                    state["cprofile"] = None
+                    state["cprofile_owner"] = None
+        if finished:
+            import io
+            import pstats
+
+            stamp = time.strftime("%Y%m%d-%H%M%S")
+            profiler.dump_stats(str(PROFILE_DIR / f"cprofile-{stamp}.prof"))
+            summary = io.StringIO()
+            pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(40)
+            (PROFILE_DIR / f"cprofile-{stamp}.txt").write_text(summary.getvalue(), encoding="utf-8")
+
+    with state["lock"]:
+        state["reruns"] += 1
+        rerun_number = state["reruns"]
+        record = {
+            "rerun": rerun_number,
+            "time": time.time(),
+            "session": get_profile_session_id()[:8],
+            "wall_ms": round(wall * 1000, 2),
+            "alloc_delta_kb": round((current - run["allocated"]) / 1024, 1),
+            "traced_kb": round(current / 1024, 1),
+            "peak_kb": round(peak / 1024, 1),
+            "ws_kb": round(run.get("ws_bytes", 0) / 1024, 2),
+            "ws_messages": run.get("ws_messages", 0),
+            "slide": st.session_state.get("current_index"),
+            "autoplay": st.session_state.get("autoplay"),
+        }
+        with open(PROFILE_DIR / "reruns.jsonl", "a", encoding="utf-8") as fh:
+            fh.write(json.dumps(record) + "\n")
+        if rerun_number % PROFILE_SNAPSHOT_EVERY == 0:
+            write_tracemalloc_report(state, rerun_number)
+
+    history = st.session_state.setdefault("profile_history", [])
+    history.append(record)
+    del history[:-20]
+
+def rerun():
+    """Close out the rerun's profile record, then ask Streamlit to rerun"""
+    finish_rerun_profile()
+    st.rerun()
+
+start_rerun_profile()
+
+# -----------------------
+# Custom CSS Theme
+# -----------------------
+# The theme lives in static/theme.css and is linked rather than inlined, so each
+# rerun sends a one-line <link> instead of the whole stylesheet. The content hash
+# in the URL busts the browser cache when the file changes.
+THEME_CSS_PATH = Path(__file__).parent / "static" / "theme.css"
+
+st.markdown(get_static_css_tag(str(THEME_CSS_PATH)), unsafe_allow_html=True)
+
+# -----------------------
+# Extract Folder ID
+# -----------------------
+def extract_folder_id(url: str):
+    """Extract folder ID from various Google Drive URL formats"""
+    patterns = [
+        r'/folders/([a-zA-Z0-9_-]+)',
+        r'id=([a-zA-Z0-9_-]+)',
+        r'^([a-zA-Z0-9_-]+)$'
+    ]
+    for p in patterns:
+        m = re.search(p, url)
+        if m:
+            return m.group(1)
+    raise ValueError("Invalid Google Drive folder link.")
+
+def get_gdrive_image_urls(folder_id: str):
+    """
+    Extract individual image URLs from a public Google Drive folder.
+    Uses multiple methods to reliably fetch images from public folders.
+    """
+    images = []
     
-    .info-card h3 {
-        color: var(--primary-color);
-        margin-top: 0;
+    try:
+        folder_url = f"https://drive.google.com/drive/folders/{folder_id}"
+        headers = {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+        }
+        
+        response = requests.get(folder_url, headers=headers, timeout=15)
+        
+        if response.status_code == 200:
+            html_content = response.text
+            
+            # Method 1: Extract all 33-character file IDs from the page
+            # Google Drive embeds file metadata in JavaScript data structures
+            all_file_ids = re.findall(r'"([a-zA-Z0-9_-]{33})"', html_content)
+            
+            seen = set()
+            for file_id in all_file_ids:
+                if file_id != folder_id and file_id not in seen:
+                    seen.add(file_id)
+                    images.append({
+                        "name": f"Image {len(images)+1}.jpg",
+                        "url": f"https://drive.google.com/uc?export=view&id={file_id}",
+                        "source": "gdrive",
+                        "file_id": file_id
+                    })
+            
+            # Method 2: Also search for 28-character file IDs (alternative format)
+            if len(images) < 50:
+                alt_file_ids = re.findall(r'"([a-zA-Z0-9_-]{28})"', html_content)
+                for file_id in alt_file_ids:
+                    if file_id != folder_id and file_id not in seen and len(file_id) == 28:
+                        seen.add(file_id)
+                        images.append({
+                            "name": f"Image {len(images)+1}.jpg",
+                            "url": f"https://drive.google.com/uc?export=view&id={file_id}",
+                            "source": "gdrive",
+                            "file_id": file_id
+                        })
+            
+            # Method 3: Search for file IDs in data attributes and JSON structures
+            if len(images) < 50:
+                json_pattern = r'\["([a-zA-Z0-9_-]{25,})"'
+                json_ids = re.findall(json_pattern, html_content)
+                for file_id in json_ids:
+                    if file_id != folder_id and file_id not in seen and len(file_id) >= 25:
+                        seen.add(file_id)
+                        images.append({
+                            "name": f"Image {len(images)+1}.jpg",
+                            "url": f"https://drive.google.com/uc?export=view&id={file_id}",
+                            "source": "gdrive",
+                            "file_id": file_id
+                        })
+        
+        if images:
+            st.success(f"✅ Found {len(images)} images in Google Drive folder")
+            return images
+        else:
+            st.warning("⚠️ Could not find images. Please ensure:")
+            st.markdown("""
+            - Folder sharing: "Anyone with the link can view"
+            - Folder contains image files
+            - Use folder ID: `1LfSwuD7WxbS0ZdDeGo0hpiviUx6vMhqs`
+            """)
+        
+        return []
+        
+    except Exception as e:
+        st.error(f"❌ Error loading from Google Drive: {str(e)}")
+        st.info("💡 Try using just the folder ID instead of the full URL")
+        return []
+
+# -----------------------
+# Shared Cross-Process Cache
+# -----------------------
+# SQLite blob store shared by every Streamlit process on the host. WAL mode lets
+# replicas read concurrently; writes are single transactions, so entries appear
+# atomically. Leases stop several replicas from fetching the same key at once.
+SHARED_CACHE_PATH = os.environ.get("SHARED_CACHE_PATH", ".cache/slides.sqlite3")
+SHARED_CACHE_MAX_BYTES = int(os.environ.get("SHARED_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+SHARED_CACHE_LEASE_SECONDS = 30
+# A running fill keeps renewing its lease for up to this long (large RAW decodes and
+# slow downloads take minutes); after that waiters assume it is stuck and take over
+SHARED_CACHE_FILL_BUDGET_SECONDS = int(os.environ.get("SHARED_CACHE_FILL_BUDGET_SECONDS", "600"))
+# Reads refresh an entry's LRU time at most this often, so hot reads stay read-only
+SHARED_CACHE_TOUCH_SECONDS = 60
+SHARED_CACHE_SCHEMA_VERSION = 2
+MANIFEST_CACHE_TTL = 300
+IMAGE_CACHE_TTL = 24 * 3600
+
+@st.cache_resource
+def get_shared_cache_local():
+    """Thread-local holder for SQLite connections (connections can't cross threads)"""
+    import threading
+
+    Path(SHARED_CACHE_PATH).parent.mkdir(parents=True, exist_ok=True)
+    return threading.local()
+
+def get_shared_cache_conn():
+    """Open (once per thread) a connection to the shared cache database"""
+    import sqlite3
+
+    local = get_shared_cache_local()
+    conn = getattr(local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(SHARED_CACHE_PATH, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        # REPLACE only fires the delete trigger below with recursive triggers on
+        conn.execute("PRAGMA recursive_triggers=ON")
+        create_shared_cache_schema(conn)
+        local.conn = conn
+    return conn
+
+def create_shared_cache_schema(conn):
+    """Create (or rebuild from an older layout) the cache tables; entries are disposable"""
+    if conn.execute("PRAGMA user_version").fetchone()[0] == SHARED_CACHE_SCHEMA_VERSION:
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if conn.execute("PRAGMA user_version").fetchone()[0] != SHARED_CACHE_SCHEMA_VERSION:
+            conn.execute("DROP TABLE IF EXISTS blobs")
+            conn.execute("DROP TABLE IF EXISTS meta")
+            # Small columns come before the value so reading them never walks overflow pages
+            conn.execute("""
+                CREATE TABLE blobs (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    expires REAL,
+                    accessed REAL NOT NULL,
+                    value BLOB NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )
+            """)
+            conn.execute("CREATE INDEX blobs_accessed ON blobs (accessed, size)")
+            # Running total of blob sizes, kept in step by triggers in the writing transaction
+            conn.execute("CREATE TABLE meta (id INTEGER PRIMARY KEY CHECK (id = 1), total_size INTEGER NOT NULL)")
+            conn.execute("INSERT INTO meta (id, total_size) VALUES (1, 0)")
+            conn.execute("""
+                CREATE TRIGGER blobs_size_insert AFTER INSERT ON blobs
+                BEGIN UPDATE meta SET total_size = total_size + NEW.size WHERE id = 1; END
+            """)
+            conn.execute("""
+                CREATE TRIGGER blobs_size_delete AFTER DELETE ON blobs
+                BEGIN UPDATE meta SET total_size = total_size - OLD.size WHERE id = 1; END
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS leases (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    expires REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )
+            """)
+            conn.execute(f"PRAGMA user_version = {SHARED_CACHE_SCHEMA_VERSION}")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+def shared_cache_get(namespace: str, key: str):
+    """Return cached bytes, or None if missing or expired"""
+    conn = get_shared_cache_conn()
+    now = time.time()
+    row = conn.execute(
+        "SELECT value, expires, accessed FROM blobs WHERE namespace = ? AND key = ?",
+        (namespace, key)
+    ).fetchone()
+    if row is None:
+        return None
+    if row[1] is not None and row[1] < now:
+        conn.execute("DELETE FROM blobs WHERE namespace = ? AND key = ?", (namespace, key))
+        return None
+    if now - row[2] > SHARED_CACHE_TOUCH_SECONDS:
+        conn.execute("UPDATE blobs SET accessed = ? WHERE namespace = ? AND key = ?", (now, namespace, key))
+    return bytes(row[0])
+
+def shared_cache_has(namespace: str, key: str):
+    """Check for a live entry without reading its value"""
+    row = get_shared_cache_conn().execute(
+        "SELECT 1 FROM blobs WHERE namespace = ? AND key = ? AND (expires IS NULL OR expires >= ?)",
+        (namespace, key, time.time())
+    ).fetchone()
+    return row is not None
+
+def shared_cache_put(namespace: str, key: str, value: bytes, ttl=None):
+    """Store bytes atomically, then trim least recently used entries over the size cap"""
+    conn = get_shared_cache_conn()
+    now = time.time()
+    expires = now + ttl if ttl else None
+    conn.execute(
+        "INSERT OR REPLACE INTO blobs (namespace, key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?, ?)",
+        (namespace, key, value, len(value), expires, now)
+    )
+    total = conn.execute("SELECT total_size FROM meta WHERE id = 1").fetchone()[0]
+    if total > SHARED_CACHE_MAX_BYTES:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            total = conn.execute("SELECT total_size FROM meta WHERE id = 1").fetchone()[0]
+            while total > SHARED_CACHE_MAX_BYTES * 0.9:
+                rows = conn.execute("SELECT rowid, size FROM blobs ORDER BY accessed LIMIT 256").fetchall()
+                if not rows:
+                    break
+                for rowid, size in rows:
+                    if total <= SHARED_CACHE_MAX_BYTES * 0.9:
+                        break
+                    conn.execute("DELETE FROM blobs WHERE rowid = ?", (rowid,))
+                    total -= size
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+def renew_shared_cache_lease(namespace: str, key: str, done):
+    """Keep a fill's lease alive until done is set or the fill budget runs out"""
+    import sqlite3
+
+    conn = None
+    deadline = time.time() + SHARED_CACHE_FILL_BUDGET_SECONDS
+    try:
+        while not done.wait(SHARED_CACHE_LEASE_SECONDS / 3) and time.time() < deadline:
+            if conn is None:
+                conn = sqlite3.connect(SHARED_CACHE_PATH, timeout=30, isolation_level=None)
+            conn.execute("UPDATE leases SET expires = ? WHERE namespace = ? AND key = ?",
+                         (time.time() + SHARED_CACHE_LEASE_SECONDS, namespace, key))
+    finally:
+        if conn is not None:
+            conn.close()
+
+def shared_cache_fetch(namespace: str, key: str, fill, ttl=None):
+    """
+    Get a value from the shared cache, calling fill() on a miss.
+    Only the process holding the lease runs fill(); the others poll for its result
+    for as long as the holder keeps renewing the lease, and take over once it lapses.
+    fill() may return None to signal failure (nothing is cached).
+    """
+    import threading
+
+    value = shared_cache_get(namespace, key)
+    if value is not None:
+        return value
+
+    conn = get_shared_cache_conn()
+    poll = 0.1
+    while True:
+        now = time.time()
+        conn.execute("DELETE FROM leases WHERE expires < ?", (now,))
+        acquired = conn.execute(
+            "INSERT OR IGNORE INTO leases (namespace, key, expires) VALUES (?, ?, ?)",
+            (namespace, key, now + SHARED_CACHE_LEASE_SECONDS)
+        ).rowcount == 1
+        if acquired:
+            done = threading.Event()
+            threading.Thread(target=renew_shared_cache_lease, args=(namespace, key, done), daemon=True,
+                             name=f"lease-{namespace}").start()
+            try:
+                value = fill()
+                if value is not None:
+                    shared_cache_put(namespace, key, value, ttl)
+                return value
+            finally:
+                done.set()
+                conn.execute("DELETE FROM leases WHERE namespace = ? AND key = ?", (namespace, key))
+
+        time.sleep(poll)
+        poll = min(poll * 2, 1.0)
+        value = shared_cache_get(namespace, key)
+        if value is not None:
+            return value
+
+# -----------------------
+# Get Public Drive Images
+# -----------------------
+def get_public_drive_images(folder_id: str):
+    """
+    Get publicly accessible images from Google Drive folder.
+    Works with folders that have 'Anyone with the link can view' permission.
+    Scraped listings are shared with other processes through the shared cache.
+    """
+    import json
+
+    def scrape():
+        images = get_gdrive_image_urls(folder_id)
+        return json.dumps(images).encode() if images else None
+
+    payload = shared_cache_fetch("manifest", f"scrape:{folder_id}", scrape, ttl=MANIFEST_CACHE_TTL)
+    return json.loads(payload) if payload else []
+
+# -----------------------
+# Drive API v3 Listing Backend
+# -----------------------
+# Listing itself lives in drive_api.py; this section adds caching and the UI glue.
+# Each process keeps the most recently used manifests in memory; the shared cache
+# holds every folder's copy, so an evicted manifest is reloaded from there.
+DRIVE_MANIFEST_STORE_SIZE = int(os.environ.get("DRIVE_MANIFEST_STORE_SIZE", "8"))
+
+def get_drive_api_key():
+    """Read the Drive API key from the environment or Streamlit secrets"""
+    key = os.environ.get("DRIVE_API_KEY", "")
+    if not key:
+        try:
+            key = st.secrets.get("DRIVE_API_KEY", "")
+        except Exception:
+            key = ""
+    return key
+
+@st.cache_resource
+def get_drive_manifest_store():
+    """Process-wide LRU of manifests keyed by folder ID, with their encoded sizes"""
+    import threading
+    from collections import OrderedDict
+
+    return {"manifests": OrderedDict(), "sizes": {}, "lock": threading.Lock()}
+
+def load_drive_manifest(folder_id: str):
+    """A folder's manifest from this process's LRU, else from the shared cache (None if neither has it)"""
+    import json
+
+    store = get_drive_manifest_store()
+    with store["lock"]:
+        manifest = store["manifests"].get(folder_id)
+        if manifest is not None:
+            store["manifests"].move_to_end(folder_id)
+            return manifest
+    cached = shared_cache_get("manifest", f"drive_api:{folder_id}")
+    if not cached:
+        return None
+    manifest = json.loads(cached)
+    remember_drive_manifest(folder_id, manifest, len(cached))
+    return manifest
+
+def remember_drive_manifest(folder_id: str, manifest: dict, size: int):
+    """Keep a manifest in memory, evicting the least recently used beyond DRIVE_MANIFEST_STORE_SIZE"""
+    store = get_drive_manifest_store()
+    with store["lock"]:
+        store["manifests"][folder_id] = manifest
+        store["manifests"].move_to_end(folder_id)
+        store["sizes"][folder_id] = size
+        while len(store["manifests"]) > DRIVE_MANIFEST_STORE_SIZE:
+            evicted, _ = store["manifests"].popitem(last=False)
+            store["sizes"].pop(evicted, None)
+
+def sync_drive_manifest(folder_id: str, api_key: str, full: bool = False):
+    """
+    Bring the cached manifest for a folder up to date, starting from this process's
+    copy or another replica's copy in the shared cache.
+    """
+    import json
+
+    # A full listing starts from scratch; otherwise sync forward from the newest copy
+    manifest = None if full else load_drive_manifest(folder_id)
+    manifest, changed = update_drive_manifest(manifest, folder_id, api_key, full=full)
+    payload = json.dumps(manifest).encode()
+    remember_drive_manifest(folder_id, manifest, len(payload))
+    shared_cache_put("manifest", f"drive_api:{folder_id}", payload, ttl=DRIVE_API_FULL_SYNC_SECONDS)
+    return manifest, changed
+
+def get_drive_manifest_order(manifest: dict):
+    """Name-sorted file IDs for a manifest, computed once per change"""
+    if manifest.get("order") is None:
+        files = manifest["files"]
+        manifest["order"] = sorted(files, key=lambda fid: files[fid].get("name", fid).lower())
+    return manifest["order"]
+
+def get_drive_api_file_ids(folder_id: str, api_key: str, full: bool = False):
+    """Get the complete, name-sorted list of image file IDs for a folder from the Drive API"""
+    try:
+        manifest, changed = sync_drive_manifest(folder_id, api_key, full=full)
+    except requests.HTTPError as e:
+        st.error(f"❌ Drive API error: {e.response.status_code} {e.response.text[:200]}")
+        st.info("💡 Check the API key and that the folder is shared publicly")
+        return []
+    except Exception as e:
+        st.error(f"❌ Error loading from Drive API: {str(e)}")
+        return []
+
+    file_ids = get_drive_manifest_order(manifest)
+    st.success(f"✅ Found {len(file_ids)} images via Drive API ({changed} changed since last sync)")
+    return file_ids
+
+# -----------------------
+# Local Mirror Sync
+# -----------------------
+# Mirrors a Drive folder into MIRROR_DIR/<folder_id> so slides are served from disk.
+# Files are stored as <file_id><ext> next to a .mirror.json index of what is on disk.
+MIRROR_DIR = os.environ.get("MIRROR_DIR", "public")
+MIRROR_INDEX_NAME = ".mirror.json"
+MIRROR_LOCK_NAME = ".mirror.lock"
+MIRROR_CHUNK_SIZE = 1024 * 1024
+MIRROR_LOCK_RETRY_SECONDS = 5
+# Progress is written to the index this often during a sync, so a restart resumes from it
+MIRROR_INDEX_SAVE_SECONDS = 10
+# A syncer stops once no session has shown or loaded its folder for this long
+MIRROR_IDLE_STOP_SECONDS = int(os.environ.get("MIRROR_IDLE_STOP_SECONDS", "1800"))
+# Load Gallery waits at most this long for a first sync, then shows what is mirrored so far
+MIRROR_FIRST_SYNC_WAIT_SECONDS = 30
+
+def get_mirror_path(folder_id: str):
+    """Local directory holding the mirror of a folder"""
+    return Path(MIRROR_DIR) / folder_id
+
+def load_mirror_index(folder_id: str):
+    """Read the mirror index ({file_id: record}), empty if the folder was never synced"""
+    import json
+
+    index_path = get_mirror_path(folder_id) / MIRROR_INDEX_NAME
+    try:
+        with open(index_path, "r", encoding="utf-8") as fh:
+            return json.load(fh)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def save_mirror_index(folder_id: str, index: dict):
+    """Write the mirror index atomically so readers never see a partial file"""
+    import json
+
+    index_path = get_mirror_path(folder_id) / MIRROR_INDEX_NAME
+    tmp_path = index_path.with_name(index_path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as fh:
+        json.dump(index, fh)
+    os.replace(tmp_path, index_path)
+
+def lock_mirror_folder(folder: Path):
+    """
+    Take the host-wide sync lock for a mirror folder without blocking.
+    Returns the open lock file (close it to release) or None if another process holds it.
+    """
+    lock_file = open(folder / MIRROR_LOCK_NAME, "a")
+    try:
+        import fcntl
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except ImportError:
+        # No flock on this platform; replicas sharing a mirror are unsupported there
+        pass
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+def mirror_file_name(f: dict):
+    """On-disk name for a Drive file: its ID plus the original extension"""
+    return f["id"] + Path(f.get("name", "")).suffix.lower()
+
+def mirror_is_current(record, f: dict, folder: Path):
+    """Delta check: prefer md5Checksum, fall back to size, then to presence on disk"""
+    if not record or not (folder / record["file"]).exists():
+        return False
+    if f.get("md5Checksum"):
+        return record.get("md5") == f["md5Checksum"]
+    if f.get("size"):
+        return record.get("size") == int(f["size"])
+    return True
+
+def file_md5(path: Path):
+    """Hex md5 of a file, read in mirror-sized chunks"""
+    import hashlib
+
+    md5 = hashlib.md5()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(MIRROR_CHUNK_SIZE), b""):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+def mirror_record(f: dict, dest: Path, md5: str):
+    """Index entry for a mirrored file"""
+    return {
+        "file": dest.name,
+        "name": f.get("name", dest.name),
+        "size": dest.stat().st_size,
+        "md5": md5,
+        "modified_time": f.get("modifiedTime"),
     }
-    
-    /* Simplified stats container for cleaner look */
-    .stats-container {
-        display: flex;
-        justify-content: center;
-        margin: 2rem 0 1rem 0;
-        flex-wrap: wrap;
-        gap: 1.5rem;
+
+def download_to_mirror(session, f: dict, folder: Path, api_key: str):
+    """
+    Download one file into the mirror, resuming from a leftover .part file.
+    The finished file is checked against size/md5 before being renamed into place.
+    A file already on disk with the expected md5 (e.g. finished before a restart
+    but not yet indexed) is adopted without downloading it again.
+    """
+    dest = folder / mirror_file_name(f)
+    if f.get("md5Checksum") and dest.exists() and file_md5(dest) == f["md5Checksum"]:
+        return mirror_record(f, dest, f["md5Checksum"])
+    part = dest.with_name(dest.name + ".part")
+    offset = part.stat().st_size if part.exists() else 0
+    headers = drive_api_headers(api_key)
+    if offset:
+        headers["Range"] = f"bytes={offset}-"
+    with session.get(f"{DRIVE_API_BASE_URL}/files/{f['id']}", params={"alt": "media"},
+                     headers=headers, stream=True, timeout=60) as response:
+        if response.status_code == 416:
+            # Partial file is already complete (or stale); verify below
+            pass
+        else:
+            response.raise_for_status()
+            mode = "ab" if offset and response.status_code == 206 else "wb"
+            with open(part, mode) as fh:
+                for chunk in response.iter_content(MIRROR_CHUNK_SIZE):
+                    fh.write(chunk)
+
+    md5 = file_md5(part)
+    size = part.stat().st_size
+    if (f.get("size") and size != int(f["size"])) or (f.get("md5Checksum") and md5 != f["md5Checksum"]):
+        part.unlink()
+        raise IOError(f"Checksum mismatch for {f.get('name', f['id'])}")
+
+    os.replace(part, dest)
+    return mirror_record(f, dest, md5)
+
+def sync_mirror(folder_id: str, api_key: str, max_workers: int = 4):
+    """
+    Bring the local mirror in line with the Drive folder.
+    Downloads new or changed files in parallel and deletes files removed upstream.
+    Returns None without syncing if another process on the host is syncing the folder.
+    """
+    folder = get_mirror_path(folder_id)
+    folder.mkdir(parents=True, exist_ok=True)
+    lock_file = lock_mirror_folder(folder)
+    if lock_file is None:
+        return None
+    try:
+        return sync_locked_mirror(folder_id, folder, api_key, max_workers)
+    finally:
+        lock_file.close()
+
+def sync_locked_mirror(folder_id: str, folder: Path, api_key: str, max_workers: int):
+    """Sync a mirror folder whose lock is held by this process"""
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    # Full listing: files deleted outright never show up in a modifiedTime query
+    manifest, _ = sync_drive_manifest(folder_id, api_key, full=True)
+    remote = manifest["files"]
+    index = load_mirror_index(folder_id)
+    stats = {"downloaded": 0, "deleted": 0, "failed": 0, "unchanged": 0}
+
+    # Deletion propagation
+    for file_id in [fid for fid in index if fid not in remote]:
+        record = index.pop(file_id)
+        for stale in (folder / record["file"], folder / (record["file"] + ".part")):
+            if stale.exists():
+                stale.unlink()
+        stats["deleted"] += 1
+    if stats["deleted"]:
+        save_mirror_index(folder_id, index)
+
+    pending = [f for fid, f in remote.items() if not mirror_is_current(index.get(fid), f, folder)]
+    stats["unchanged"] = len(remote) - len(pending)
+
+    saved_at = time.time()
+    with requests.Session() as session:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = {pool.submit(download_to_mirror, session, f, folder, api_key): f for f in pending}
+            for future in as_completed(futures):
+                f = futures[future]
+                try:
+                    index[f["id"]] = future.result()
+                    stats["downloaded"] += 1
+                except Exception:
+                    stats["failed"] += 1
+                if time.time() - saved_at >= MIRROR_INDEX_SAVE_SECONDS:
+                    save_mirror_index(folder_id, index)
+                    saved_at = time.time()
+
+    save_mirror_index(folder_id, index)
+    return stats
+
+def describe_sync_error(e: Exception):
+    """Sidebar text for a failed sync; request URLs (and anything in them) stay out of it"""
+    if isinstance(e, requests.HTTPError) and e.response is not None:
+        return f"Drive returned HTTP {e.response.status_code} {e.response.reason}"
+    if isinstance(e, requests.RequestException):
+        return f"Could not reach Drive ({type(e).__name__})"
+    return str(e)
+
+def stop_idle_mirror_syncer(state: dict):
+    """Retire a syncer nobody has used for MIRROR_IDLE_STOP_SECONDS; returns True if it was stopped"""
+    with get_mirror_syncer_lock():
+        if time.time() - state["last_used"] < MIRROR_IDLE_STOP_SECONDS:
+            return False
+        state["stop"].set()
+        syncers = get_mirror_syncers()
+        if syncers.get(state["folder_id"]) is state:
+            del syncers[state["folder_id"]]
+        return True
+
+def run_mirror_syncer(state: dict):
+    """Background loop: sync, then wait for the interval or a manual trigger"""
+    while not state["stop"].is_set() and not stop_idle_mirror_syncer(state):
+        state["running"] = True
+        try:
+            stats = sync_mirror(state["folder_id"], state["api_key"])
+            state["last_error"] = None
+        except Exception as e:
+            stats = {}
+            state["last_error"] = describe_sync_error(e)
+        state["running"] = False
+        if stats is None:
+            # Another process is syncing this folder; retry soon instead of duplicating its work
+            state["waiting"] = True
+            state["trigger"].wait(min(state["interval"], MIRROR_LOCK_RETRY_SECONDS))
+            state["trigger"].clear()
+            continue
+        state["waiting"] = False
+        state["last_stats"] = stats or state["last_stats"]
+        state["last_sync"] = time.time()
+        state["trigger"].wait(state["interval"])
+        state["trigger"].clear()
+
+@st.cache_resource
+def get_mirror_syncers():
+    """Background syncers keyed by folder ID, shared by every session in the process"""
+    return {}
+
+@st.cache_resource
+def get_mirror_syncer_lock():
+    """Guards get_mirror_syncers() so a retiring syncer is never handed to a new session"""
+    import threading
+
+    return threading.Lock()
+
+def touch_mirror_syncer(folder_id: str):
+    """Mark a folder's syncer as in use and return it (None if it isn't running)"""
+    with get_mirror_syncer_lock():
+        state = get_mirror_syncers().get(folder_id)
+        if state:
+            state["last_used"] = time.time()
+        return state
+
+def start_mirror_syncer(folder_id: str, api_key: str, interval: int):
+    """Start (or retune) the background syncer for a folder and return its state"""
+    import threading
+
+    with get_mirror_syncer_lock():
+        syncers = get_mirror_syncers()
+        state = syncers.get(folder_id)
+        if state and state["thread"].is_alive() and not state["stop"].is_set():
+            state["api_key"] = api_key
+            state["interval"] = interval
+            state["last_used"] = time.time()
+            return state
+
+        state = {
+            "folder_id": folder_id,
+            "api_key": api_key,
+            "interval": interval,
+            "stop": threading.Event(),
+            "trigger": threading.Event(),
+            "running": False,
+            "waiting": False,
+            "last_used": time.time(),
+            "last_sync": None,
+            "last_stats": None,
+            "last_error": None,
+        }
+        state["thread"] = threading.Thread(target=run_mirror_syncer, args=(state,), daemon=True,
+                                           name=f"mirror-sync-{folder_id}")
+        syncers[folder_id] = state
+        state["thread"].start()
+    return state
+
+def get_mirror_file_ids(folder_id: str):
+    """Name-sorted file IDs available in the local mirror"""
+    index = load_mirror_index(folder_id)
+    return sorted(index, key=lambda fid: index[fid].get("name", fid).lower())
+
+# -----------------------
+# Windowed Catalog
+# -----------------------
+# Sessions keep only the ordered file IDs; full items are resolved a page at a
+# time around the current slide and dropped once they fall out of the window
+CATALOG_PAGE_SIZE = 100
+CATALOG_WINDOW_PAGES = 1
+
+def build_catalog(backend: str, folder_id: str, file_ids: list):
+    """Create a lazily resolved catalog over an ordered list of file IDs"""
+    return {
+        "backend": backend,
+        "folder_id": folder_id,
+        "ids": list(file_ids),
+        "pages": {},
+        "ids_bytes": None,
     }
-    
-    .stat-box {
-        background: linear-gradient(135deg, rgba(99, 102, 241, 0.2), rgba(139, 92, 246, 0.2));
-        padding: 1.2rem 2.5rem;
-        border-radius: 1rem;
-        text-align: center;
-        box-shadow: 0 5px 20px rgba(99, 102, 241, 0.2);
-        border: 1px solid rgba(99, 102, 241, 0.3);
-        backdrop-filter: blur(10px);
-        min-width: 140px;
+
+def catalog_total(catalog):
+    """Number of slides in a catalog (0 when nothing is loaded)"""
+    return len(catalog["ids"]) if catalog else 0
+
+def get_catalog_source(catalog: dict):
+    """Metadata lookup ({file_id: record}) backing a catalog, if it has one"""
+    if catalog.get("records") is not None:
+        # Snapshot carried by the catalog itself (channels)
+        return catalog["records"]
+    if catalog["backend"] == "drive_api":
+        manifest = load_drive_manifest(catalog["folder_id"])
+        return manifest["files"] if manifest else {}
+    if catalog["backend"] == "mirror":
+        return load_mirror_index(catalog["folder_id"])
+    return {}
+
+def resolve_catalog_item(catalog: dict, position: int, source: dict):
+    """Build the gallery item for one catalog position"""
+    file_id = catalog["ids"][position]
+    record = source.get(file_id)
+    if record and catalog["backend"] == "drive_api":
+        return drive_file_to_item(record)
+    if record and catalog["backend"] == "mirror":
+        return {
+            "name": record["name"],
+            "path": str(get_mirror_path(catalog["folder_id"]) / record["file"]),
+            "source": "local",
+            "file_id": file_id,
+            "size": record.get("size"),
+            "modified_time": record.get("modified_time"),
+            "md5": record.get("md5"),
+        }
+    return {
+        "name": f"Image {position + 1}.jpg",
+        "url": f"https://drive.google.com/uc?export=view&id={file_id}",
+        "source": "gdrive",
+        "file_id": file_id
     }
+
+def load_catalog_page(catalog: dict, page: int):
+    """Resolve every item on a catalog page"""
+    start = page * CATALOG_PAGE_SIZE
+    end = min(start + CATALOG_PAGE_SIZE, catalog_total(catalog))
+    source = get_catalog_source(catalog)
+    return [resolve_catalog_item(catalog, pos, source) for pos in range(start, end)]
+
+@st.cache_resource
+def get_catalog_lock():
+    """Guards catalog page dicts, which the memory reaper trims from another thread"""
+    import threading
+
+    return threading.Lock()
+
+def get_catalog_item(catalog: dict, index: int):
+    """
+    Return the item at index, loading the pages around it on demand.
+    Pages outside the window are evicted so resident items stay bounded.
+    """
+    page = index // CATALOG_PAGE_SIZE
+    last_page = (catalog_total(catalog) - 1) // CATALOG_PAGE_SIZE
+    window = range(max(0, page - CATALOG_WINDOW_PAGES), min(last_page, page + CATALOG_WINDOW_PAGES) + 1)
+
+    with get_catalog_lock():
+        pages = catalog["pages"]
+        for p in list(pages):
+            if p not in window:
+                del pages[p]
+        items = pages.get(page)
+    if items is None:
+        # Resolved outside the lock; a concurrent trim can drop the page but not our reference
+        items = load_catalog_page(catalog, page)
+        with get_catalog_lock():
+            catalog["pages"][page] = items
+    return items[index - page * CATALOG_PAGE_SIZE]
+
+# -----------------------
+# Decode Service
+# -----------------------
+# Heavy formats (RAW, HEIC, TIFF, ...) and large files are decoded in worker
+# processes so they use every core and a runaway decode can't stall the script thread.
+# Each worker runs one job at a time, so a job that times out costs only its own
+# worker: that process is killed and replaced while other sessions' decodes carry on.
+# Workers are spawned (not forked) and import only decode_worker.
+DECODE_WORKERS = int(os.environ.get("DECODE_WORKERS", str(os.cpu_count() or 2)))
+DECODE_TIMEOUT = float(os.environ.get("DECODE_TIMEOUT", "60"))
+DECODE_MEMORY_LIMIT = int(float(os.environ.get("DECODE_MEMORY_LIMIT_MB", "2048")) * 1024 ** 2)
+HEAVY_DECODE_BYTES = int(float(os.environ.get("HEAVY_DECODE_MB", "8")) * 1024 ** 2)
+# Workers are recycled after this many jobs so memory leaked by decoders is returned
+DECODE_JOBS_PER_WORKER = 100
+
+@st.cache_resource
+def get_decode_service():
+    """Process-wide queue of worker slots; a slot holds a worker or None until first use"""
+    import queue
+
+    slots = queue.Queue()
+    for _ in range(DECODE_WORKERS):
+        slots.put(None)
+    return {"slots": slots}
+
+def start_decode_worker():
+    """Spawn one decode worker and return its handle"""
+    import multiprocessing
+
+    ctx = multiprocessing.get_context("spawn")
+    conn, child_conn = ctx.Pipe()
+    process = ctx.Process(target=serve_decode_jobs, args=(child_conn, DECODE_MEMORY_LIMIT),
+                          daemon=True, name="decode-worker")
+    process.start()
+    child_conn.close()
+    return {"process": process, "conn": conn, "jobs": 0}
+
+def stop_decode_worker(worker: dict, kill: bool = False):
+    """Retire a worker: closing its pipe ends it cleanly, kill ends a stuck one now"""
+    worker["conn"].close()
+    if kill:
+        worker["process"].kill()
+        worker["process"].join(1)
+
+def run_decode_job(source, name: str = ""):
+    """Decode on a free worker, waiting up to DECODE_TIMEOUT for one and again for the job"""
+    import queue
+
+    slots = get_decode_service()["slots"]
+    try:
+        worker = slots.get(timeout=DECODE_TIMEOUT)
+    except queue.Empty:
+        return None
+    try:
+        if worker is None or not worker["process"].is_alive():
+            worker = start_decode_worker()
+        worker["conn"].send((source, name, DISPLAY_MAX_EDGE))
+        if not worker["conn"].poll(DECODE_TIMEOUT):
+            stop_decode_worker(worker, kill=True)
+            worker = None
+            return None
+        status, result = worker["conn"].recv()
+        worker["jobs"] += 1
+        if worker["jobs"] >= DECODE_JOBS_PER_WORKER:
+            stop_decode_worker(worker)
+            worker = None
+        return result if status == "ok" else None
+    except (OSError, EOFError):
+        # The worker died mid-job (crashed decoder, hard memory limit)
+        if worker is not None:
+            stop_decode_worker(worker, kill=True)
+        worker = None
+        return None
+    finally:
+        slots.put(worker)
+
+def decode_for_display(source, name: str = "", size=None):
+    """
+    Browser-ready rendition for bytes or a file path, or None if it can't be decoded.
+    Light images are decoded inline; heavy ones go to a worker process with a timeout.
+    """
+    if not is_heavy_image(name, size, HEAVY_DECODE_BYTES):
+        try:
+            return render_display(source, name, DISPLAY_MAX_EDGE)
+        except Exception:
+            return None
+
+    return run_decode_job(source, name)
+
+# -----------------------
+# Slide Image Loading
+# -----------------------
+DISPLAY_MAX_EDGE = 2000
+PREVIEW_WIDTH = 200
+
+def download_drive_image(file_id: str):
+    """Try the known Google Drive URL formats and return the first image payload"""
+    urls_to_try = [
+        f"https://drive.google.com/uc?export=view&id={file_id}",
+        f"https://lh3.googleusercontent.com/d/{file_id}",
+        f"https://drive.google.com/thumbnail?id={file_id}&sz=w2000",
+        f"https://drive.google.com/uc?export=download&id={file_id}",
+    ]
+    for url in urls_to_try:
+        try:
+            response = requests.get(url, timeout=10, allow_redirects=True)
+            content_type = response.headers.get('Content-Type', '')
+            if response.status_code == 200 and 'image' in content_type:
+                return response.content
+        except Exception:
+            continue
+    return None
+
+def get_drive_image_bytes(file_id: str, version: str = ""):
+    """Raw image bytes for a Drive file, fetched once per host via the shared cache"""
+    return shared_cache_fetch("image", f"{file_id}:{version}", lambda: download_drive_image(file_id),
+                              ttl=IMAGE_CACHE_TTL)
+
+def display_rendition_key(file_id: str, version: str = ""):
+    """Shared-cache key of a Drive file's display rendition (namespace "rendition")"""
+    return f"{file_id}:{version}:{DISPLAY_MAX_EDGE}"
+
+def local_rendition_key(path: str, stat: os.stat_result):
+    """Shared-cache key of a local file's display rendition (namespace "rendition")"""
+    return f"local:{path}:{stat.st_size}:{stat.st_mtime_ns}:{DISPLAY_MAX_EDGE}"
+
+def preview_key(file_id: str):
+    """Shared-cache key of a Drive file's progressive-loading preview (namespace "preview")"""
+    return f"{file_id}:w{PREVIEW_WIDTH}"
+
+def get_display_rendition(file_id: str, version: str = "", name: str = ""):
+    """Browser-ready rendition for a Drive file, decoded once per host via the shared cache"""
+    def render():
+        raw = get_drive_image_bytes(file_id, version)
+        return decode_for_display(raw, name, len(raw)) if raw else None
+
+    return shared_cache_fetch("rendition", display_rendition_key(file_id, version), render, ttl=IMAGE_CACHE_TTL)
+
+def get_local_rendition(path: str, name: str = ""):
+    """Browser-ready rendition for a local file, cached by path, size and mtime"""
+    stat = os.stat(path)
+    return shared_cache_fetch("rendition", local_rendition_key(path, stat),
+                              lambda: decode_for_display(path, name, stat.st_size), ttl=IMAGE_CACHE_TTL)
+
+def has_display_rendition(file_id: str, version: str = ""):
+    """True if the full rendition is already cached and can be shown straight away"""
+    return shared_cache_has("rendition", display_rendition_key(file_id, version))
+
+def get_preview_bytes(file_id: str):
+    """Low-res Drive thumbnail shown while the full rendition loads"""
+    return shared_cache_fetch("preview", preview_key(file_id),
+                              lambda: download_drive_thumbnail(file_id, PREVIEW_WIDTH),
+                              ttl=IMAGE_CACHE_TTL)
+
+# -----------------------
+# Duplicate Detection
+# -----------------------
+# Near-duplicates (same photo re-exported or re-uploaded, alias IDs) are found by
+# hashing small grayscale thumbnails in one NumPy batch and comparing 64-bit
+# dHash/pHash values by Hamming distance.
+HASH_THUMB_SIZE = 64
+PHASH_SIZE = 32
+
+def download_drive_thumbnail(file_id: str, width: int = HASH_THUMB_SIZE):
+    """Fetch a small Drive-rendered thumbnail"""
+    url = f"https://drive.google.com/thumbnail?id={file_id}&sz=w{width}"
+    try:
+        response = requests.get(url, timeout=10, allow_redirects=True)
+        if response.status_code == 200 and 'image' in response.headers.get('Content-Type', ''):
+            return response.content
+    except Exception:
+        pass
+    return None
+
+def load_hash_thumbnail(item: dict):
+    """Grayscale PHASH_SIZE x PHASH_SIZE thumbnail for an item, or None if unavailable"""
+    from PIL import Image
+    from io import BytesIO
+
+    try:
+        if item["source"] == "local" and is_heavy_image(item["name"], item.get("size"), HEAVY_DECODE_BYTES):
+            # RAW/HEIC/large TIFF: hash the display rendition, decoded by a worker and
+            # cached for the slideshow, instead of decoding the original in this process
+            rendition = get_local_rendition(item["path"], item["name"])
+            if rendition is None:
+                return None
+            img = Image.open(BytesIO(rendition))
+            img.draft("L", (HASH_THUMB_SIZE, HASH_THUMB_SIZE))
+        elif item["source"] == "local":
+            img = open_image(item["path"], item["name"])
+            img.draft("L", (HASH_THUMB_SIZE, HASH_THUMB_SIZE))
+        else:
+            raw = shared_cache_fetch("thumb", item["file_id"], lambda: download_drive_thumbnail(item["file_id"]),
+                                     ttl=IMAGE_CACHE_TTL)
+            if raw is None:
+                return None
+            img = Image.open(BytesIO(raw))
+        return img.convert("L").resize((PHASH_SIZE, PHASH_SIZE), Image.LANCZOS)
+    except Exception:
+        return None
+
+def compute_perceptual_hashes(thumbs):
+    """
+    Vectorized dHash and pHash for a batch of grayscale thumbnails.
+    Returns two uint64 arrays of length len(thumbs).
+    """
+    import numpy as np
+    from PIL import Image
+
+    # dHash: 9x8 grid, one bit per horizontally adjacent pair
+    small = np.stack([np.asarray(t.resize((9, 8), Image.LANCZOS), dtype=np.int16) for t in thumbs])
+    dbits = (small[:, :, 1:] > small[:, :, :-1]).reshape(len(thumbs), 64)
+
+    # pHash: 2-D DCT as two matrix products over the whole batch, low 8x8 block vs. its median
+    n = PHASH_SIZE
+    k = np.arange(n)
+    dct = np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * n))
+    pixels = np.stack([np.asarray(t, dtype=np.float64) for t in thumbs])
+    coeffs = np.einsum("ij,bjk,lk->bil", dct, pixels, dct)[:, :8, :8].reshape(len(thumbs), 64)
+    medians = np.median(coeffs[:, 1:], axis=1, keepdims=True)
+    pbits = coeffs > medians
+
+    weights = (np.uint64(1) << np.arange(64, dtype=np.uint64))
+    pack = lambda bits: (bits.astype(np.uint64) * weights).sum(axis=1, dtype=np.uint64)
+    return pack(dbits), pack(pbits)
+
+def hamming_pairs(dhashes, phashes, threshold: int, chunk: int = 512):
+    """Index pairs (i < j) whose dHash and pHash both lie within threshold bits"""
+    import numpy as np
+
+    pairs = []
+    for start in range(0, len(phashes), chunk):
+        block = slice(start, start + chunk)
+        pdist = np.bitwise_count(phashes[block, None] ^ phashes[None, :])
+        ddist = np.bitwise_count(dhashes[block, None] ^ dhashes[None, :])
+        rows, cols = np.nonzero((pdist <= threshold) & (ddist <= threshold))
+        rows += start
+        keep = rows < cols
+        pairs.extend(zip(rows[keep].tolist(), cols[keep].tolist()))
+    return pairs
+
+def get_item_hashes(items: list, max_workers: int = 8):
+    """
+    (dhash, phash) per item, None where no thumbnail could be read.
+    Hashes are kept in the shared cache so only new files are fetched and hashed.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    def hash_key(item):
+        return f"{item['file_id']}:{item.get('md5') or item.get('size') or ''}"
+
+    hashes = [None] * len(items)
+    missing = []
+    for pos, item in enumerate(items):
+        cached = shared_cache_get("phash", hash_key(item))
+        if cached:
+            hashes[pos] = (int.from_bytes(cached[:8], "little"), int.from_bytes(cached[8:], "little"))
+        else:
+            missing.append(pos)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        thumbs = list(pool.map(lambda pos: load_hash_thumbnail(items[pos]), missing))
+    found = [(pos, t) for pos, t in zip(missing, thumbs) if t is not None]
+    if found:
+        dhashes, phashes = compute_perceptual_hashes([t for _, t in found])
+        for (pos, _), d, p in zip(found, dhashes.tolist(), phashes.tolist()):
+            hashes[pos] = (d, p)
+            shared_cache_put("phash", hash_key(items[pos]), d.to_bytes(8, "little") + p.to_bytes(8, "little"),
+                             ttl=IMAGE_CACHE_TTL)
+    return hashes
+
+def dedupe_catalog(catalog: dict, threshold: int = 6):
+    """
+    Collapse near-duplicate slides to one entry per cluster, in place.
+    The largest file of each cluster is kept; returns the number of slides dropped.
+    """
+    import numpy as np
+
+    source = get_catalog_source(catalog)
+    items = [resolve_catalog_item(catalog, pos, source) for pos in range(catalog_total(catalog))]
+    hashes = get_item_hashes(items)
+    hashed = [pos for pos, h in enumerate(hashes) if h is not None]
+    if len(hashed) < 2:
+        return 0
+
+    dhashes = np.array([hashes[pos][0] for pos in hashed], dtype=np.uint64)
+    phashes = np.array([hashes[pos][1] for pos in hashed], dtype=np.uint64)
+
+    # Union-find over near-duplicate pairs
+    parent = list(range(len(hashed)))
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+    for a, b in hamming_pairs(dhashes, phashes, threshold):
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+
+    clusters = {}
+    for i, pos in enumerate(hashed):
+        clusters.setdefault(find(i), []).append(pos)
+
+    dropped = set()
+    duplicates = {}
+    for members in clusters.values():
+        if len(members) < 2:
+            continue
+        keep = max(members, key=lambda pos: (items[pos].get("size") or 0, -pos))
+        duplicates[catalog["ids"][keep]] = [catalog["ids"][pos] for pos in members if pos != keep]
+        dropped.update(pos for pos in members if pos != keep)
+
+    catalog["ids"] = [fid for pos, fid in enumerate(catalog["ids"]) if pos not in dropped]
+    catalog["duplicates"] = duplicates
+    catalog["pages"] = {}
+    catalog["ids_bytes"] = None
+    return len(dropped)
+
+# -----------------------
+# Session Memory Management
+# -----------------------
+# Every session registers its catalog here so memory can be bounded per session
+# and host-wide. Idle or disconnected sessions lose their resident catalog pages
+# (they are rebuilt lazily if the tab comes back) and closed sessions are dropped.
+# Budgets cover catalog memory only: the slide ID list (~90 bytes per slide) plus
+# resident item pages (~150 KB per 100-item page). Image bytes live in the shared
+# cache and Streamlit's media manager and are not counted. The defaults fit a
+# 20k-slide folder with its full page window; larger sessions keep one page.
+SESSION_MEMORY_BUDGET = int(float(os.environ.get("SESSION_MEMORY_BUDGET_MB", "2")) * 1024 ** 2)
+GLOBAL_MEMORY_BUDGET = int(float(os.environ.get("GLOBAL_MEMORY_BUDGET_MB", "64")) * 1024 ** 2)
+SESSION_IDLE_SECONDS = int(os.environ.get("SESSION_IDLE_SECONDS", "600"))
+SESSION_REAP_INTERVAL = 60
+
+def estimate_catalog_bytes(catalog):
+    """Approximate memory held by a catalog: its ID list plus resident pages"""
+    import sys
+
+    if not catalog:
+        return 0
+    if catalog.get("ids_bytes") is None:
+        catalog["ids_bytes"] = sys.getsizeof(catalog["ids"]) + sum(sys.getsizeof(fid) for fid in catalog["ids"])
+    total = catalog["ids_bytes"] + catalog.get("records_bytes", 0)
+    with get_catalog_lock():
+        pages = list(catalog["pages"].values())
+    for items in pages:
+        for item in items:
+            total += sys.getsizeof(item) + sum(sys.getsizeof(v) for v in item.values())
+    return total
+
+def trim_catalog_pages(catalog, keep_index=None):
+    """Drop resident pages, keeping only the page holding keep_index (if given)"""
+    if not catalog:
+        return
+    keep = keep_index // CATALOG_PAGE_SIZE if keep_index is not None else None
+    with get_catalog_lock():
+        for page in list(catalog["pages"]):
+            if page != keep:
+                del catalog["pages"][page]
+
+def is_session_connected(session_id: str):
+    """Ask the Streamlit runtime whether a session still has a browser attached"""
+    try:
+        from streamlit import runtime
+        if runtime.exists():
+            return runtime.get_instance().is_active_session(session_id)
+    except Exception:
+        pass
+    return True
+
+@st.cache_resource
+def get_session_registry():
+    """Live sessions in this process, keyed by Streamlit session ID"""
+    import threading
+
+    registry = {"sessions": {}, "lock": threading.Lock()}
+    threading.Thread(target=run_session_reaper, args=(registry,), daemon=True, name="session-reaper").start()
+    return registry
+
+def touch_session():
+    """
+    Refresh the current session's registry entry and return its ID (None outside a run).
+    Cheap enough for fragment ticks, so a playing display never looks idle.
+    """
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        return None
+    registry = get_session_registry()
+    with registry["lock"]:
+        entry = registry["sessions"].setdefault(ctx.session_id, {"started": time.time()})
+        entry["last_seen"] = time.time()
+        entry["autoplay"] = st.session_state.autoplay
+        entry["catalog"] = st.session_state.catalog
+        entry["current_index"] = st.session_state.current_index
+    return ctx.session_id
+
+def register_session():
+    """Record this rerun for the current session and apply the memory budgets"""
+    session_id = touch_session()
+    if session_id is not None:
+        reclaim_session_memory(get_session_registry(), current=session_id)
+
+def reclaim_session_memory(registry: dict, current=None):
+    """
+    Enforce budgets in order: forget closed sessions, trim idle ones,
+    cap each session at SESSION_MEMORY_BUDGET, then evict the least
+    recently seen sessions until the total fits GLOBAL_MEMORY_BUDGET.
+    """
+    now = time.time()
+    with registry["lock"]:
+        sessions = registry["sessions"]
+        for sid in [sid for sid in sessions if sid != current and not is_session_connected(sid)]:
+            del sessions[sid]
+
+        for sid, entry in sessions.items():
+            idle = now - entry["last_seen"] > SESSION_IDLE_SECONDS
+            if idle and sid != current:
+                trim_catalog_pages(entry["catalog"])
+            elif estimate_catalog_bytes(entry["catalog"]) > SESSION_MEMORY_BUDGET:
+                trim_catalog_pages(entry["catalog"], entry["current_index"])
+            entry["footprint"] = estimate_catalog_bytes(entry["catalog"])
+
+        total = sum(entry["footprint"] for entry in sessions.values())
+        for sid, entry in sorted(sessions.items(), key=lambda kv: kv[1]["last_seen"]):
+            if total <= GLOBAL_MEMORY_BUDGET:
+                break
+            if sid == current:
+                continue
+            trim_catalog_pages(entry["catalog"])
+            freed = entry["footprint"] - estimate_catalog_bytes(entry["catalog"])
+            entry["footprint"] -= freed
+            total -= freed
+
+def run_session_reaper(registry: dict):
+    """Background reclamation so memory is freed even when no session reruns"""
+    while True:
+        time.sleep(SESSION_REAP_INTERVAL)
+        try:
+            reclaim_session_memory(registry)
+        except Exception:
+            pass
+
+def get_session_report():
+    """Snapshot of live sessions for display: ID, idle time, autoplay, footprint"""
+    registry = get_session_registry()
+    now = time.time()
+    with registry["lock"]:
+        return [
+            {
+                "Session": sid[:8],
+                "Idle (s)": int(now - entry["last_seen"]),
+                "Autoplay": entry["autoplay"],
+                "Slides": catalog_total(entry["catalog"]),
+                "Footprint (KB)": round(entry.get("footprint", 0) / 1024, 1),
+            }
+            for sid, entry in registry["sessions"].items()
+        ]
+
+def get_process_state_report():
+    """Rows describing the other process-wide state: manifests, channels and mirror syncers"""
+    manifests = get_drive_manifest_store()
+    with manifests["lock"]:
+        manifest_rows = (len(manifests["manifests"]), sum(manifests["sizes"].values()))
+    channels = get_channel_registry()
+    with channels["lock"]:
+        channel_count = len(channels["channels"])
+        catalogs = list(channels["catalogs"].values())
+    with get_mirror_syncer_lock():
+        syncer_count = len(get_mirror_syncers())
+    return [
+        {"State": "Drive manifests", "Entries": manifest_rows[0], "Footprint (KB)": round(manifest_rows[1] / 1024, 1)},
+        {"State": "Channel catalogs", "Entries": len(catalogs),
+         "Footprint (KB)": round(sum(estimate_catalog_bytes(c) for c in catalogs) / 1024, 1)},
+        {"State": "Channel schedulers", "Entries": channel_count, "Footprint (KB)": None},
+        {"State": "Mirror syncers", "Entries": syncer_count, "Footprint (KB)": None},
+    ]
+
+# -----------------------
+# Detect Media Type from Magic Bytes
+# -----------------------
+def detect_media_type(data_chunk):
+    """Detect media type from magic bytes - returns (is_media, type, format)"""
+    if not data_chunk or len(data_chunk) < 12:
+        return False, None, None
     
-    .stat-box h2 {
-        color: var(--primary-color);
-        font-size: 2.5rem;
-        margin: 0;
-        font-weight: 800;
-        text-shadow: 0 2px 10px rgba(99, 102, 241, 0.4);
-    }
+    # Camera RAW containers (checked before plain TIFF, which several of them extend)
+    if data_chunk.startswith(b'II*\x00') and data_chunk[8:10] == b'CR':
+        return True, "image", "CR2"
+    elif data_chunk.startswith(b'IIRO') or data_chunk.startswith(b'IIRS'):
+        return True, "image", "ORF"
+    elif data_chunk.startswith(b'IIU\x00'):
+        return True, "image", "RW2"
+    elif data_chunk.startswith(b'FUJIFILMCCD-RAW'):
+        return True, "image", "RAF"
+    elif data_chunk[4:12] == b'ftypcrx ':
+        return True, "image", "CR3"
     
-    .stat-box p {
-        color: var(--text-secondary);
-        font-size: 0.95rem;
-        margin: 0.5rem 0 0 0;
-        font-weight: 500;
-    }
+    # Image magic bytes
+    elif data_chunk.startswith(b'\xff\xd8\xff'):
+        return True, "image", "JPEG"
+    elif data_chunk.startswith(b'\x89PNG\r\n\x1a\n'):
+        return True, "image", "PNG"
+    elif data_chunk.startswith(b'GIF87a') or data_chunk.startswith(b'GIF89a'):
+        return True, "image", "GIF"
+    elif data_chunk.startswith(b'RIFF') and b'WEBP' in data_chunk[:20]:
+        return True, "image", "WEBP"
+    elif data_chunk.startswith(b'BM'):
+        return True, "image", "BMP"
+    elif data_chunk.startswith(b'<svg') or b'<SVG' in data_chunk[:100]:
+        return True, "image", "SVG"
+    elif data_chunk.startswith(b'\x00\x00\x00\x0cjP'):
+        return True, "image", "JP2"
+    elif data_chunk.startswith(b'II*\x00') or data_chunk.startswith(b'MM\x00*'):
+        return True, "image", "TIFF"
+    elif data_chunk.startswith(b'\x00\x00\x01\x00'):
+        return True, "image", "ICO"
+    elif data_chunk[4:12] in (b'ftypavif', b'ftypavis'):
+        return True, "image", "AVIF"
+    elif data_chunk[4:12] in (b'ftypheic', b'ftypheix', b'ftypmif1', b'ftypmsf1', b'ftyphevc'):
+        return True, "image", "HEIC"
+    elif data_chunk.startswith(b'v/1\x01'):
+        return True, "image", "EXR"
     
-    /* Control buttons styling */
-    .stButton > button {
-        border-radius: 0.75rem;
-        font-weight: 600;
-        transition: all 0.3s ease;
-        border: 1px solid rgba(99, 102, 241, 0.3);
-    }
+    # Video magic bytes
+    elif data_chunk.startswith(b'\x00\x00\x00\x18ftypmp42') or data_chunk.startswith(b'\x00\x00\x00\x20ftypisom'):
+        return True, "video", "MP4"
+    elif data_chunk[4:8] == b'ftyp':
+        return True, "video", "MP4/MOV"
+    elif data_chunk.startswith(b'RIFF') and b'AVI ' in data_chunk[:20]:
+        return True, "video", "AVI"
+    elif data_chunk.startswith(b'\x1aE\xdf\xa3'):
+        return True, "video", "WEBM/MKV"
     
-    .stButton > button:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 5px 20px rgba(99, 102, 241, 0.4);
+    return False, None, None
+
+# -----------------------
+# Header Metadata Index
+# -----------------------
+# Dimensions, EXIF capture time and orientation come from the first few KB of each
+# file (ranged GETs for Drive, partial reads for local files), or straight from
+# imageMediaMetadata when the Drive API manifest has it. Results live in an
+# image_meta table in the shared cache database so every process can query them.
+HEADER_READ_BYTES = 64 * 1024
+HEADER_RETRY_BYTES = 512 * 1024
+EXIF_ORIENTATION_TAG = 274
+EXIF_DATETIME_TAG = 306
+EXIF_DATETIME_ORIGINAL_TAG = 36867
+EXIF_IFD_POINTER = 0x8769
+EXIF_HEADER_FORMATS = ("JPEG", "TIFF", "CR2", "ORF", "RW2", "HEIC", "AVIF")
+TIFF_NEW_SUBFILE_TYPE_TAG = 254
+TIFF_WIDTH_TAG = 256
+TIFF_HEIGHT_TAG = 257
+TIFF_SUB_IFDS_TAG = 330
+# Drive's imageMediaMetadata.rotation (quarter turns) as EXIF orientation values
+DRIVE_ROTATION_TO_ORIENTATION = {0: 1, 1: 6, 2: 3, 3: 8}
+
+def ensure_metadata_table(conn):
+    """Create the persistent metadata index if needed"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS image_meta (
+            key TEXT PRIMARY KEY,
+            version TEXT,
+            format TEXT,
+            width INTEGER,
+            height INTEGER,
+            orientation INTEGER,
+            captured TEXT,
+            size INTEGER
+        )
+    """)
+
+def tiff_full_resolution(data: bytes):
+    """
+    (width, height) of the largest full-resolution image in a TIFF-based file, or None.
+    RAW formats such as NEF, ARW and DNG put a small preview in IFD0 and the sensor
+    image in a later IFD or a SubIFD; directories beyond the prefix are skipped.
+    """
+    from PIL import TiffImagePlugin
+    from io import BytesIO
+
+    fp = BytesIO(data)
+    header = TiffImagePlugin.ImageFileDirectory_v2(data[:8])
+    pending, seen, best = [header.next], set(), None
+    while pending:
+        offset = pending.pop()
+        if not offset or offset in seen or offset >= len(data):
+            continue
+        seen.add(offset)
+        fp.seek(offset)
+        ifd = TiffImagePlugin.ImageFileDirectory_v2(data[:8])
+        ifd.load(fp)
+        pending.append(ifd.next)
+        sub_ifds = ifd.get(TIFF_SUB_IFDS_TAG) or ()
+        pending.extend(sub_ifds if isinstance(sub_ifds, tuple) else (sub_ifds,))
+        width, height = ifd.get(TIFF_WIDTH_TAG), ifd.get(TIFF_HEIGHT_TAG)
+        reduced = ifd.get(TIFF_NEW_SUBFILE_TYPE_TAG, 0) & 1
+        if width and height and not reduced and (best is None or width * height > best[0] * best[1]):
+            best = (width, height)
+    return best
+
+def parse_image_header(data: bytes):
+    """
+    Read format, dimensions, orientation and capture time from a file prefix.
+    Raises if the prefix is not long enough to contain the header.
+    """
+    from PIL import Image
+    from io import BytesIO
+
+    is_media, media_type, fmt = detect_media_type(data)
+    if not is_media or media_type != "image":
+        return {"format": fmt}
+
+    if fmt in ("HEIC", "AVIF"):
+        register_heif_plugin()
+    # Image.open parses headers only; pixel data is never decoded
+    img = Image.open(BytesIO(data))
+    # Other formats (e.g. PNG) may keep EXIF after the pixel data, and reading it would decode the image
+    exif = img.getexif() if fmt in EXIF_HEADER_FORMATS else Image.Exif()
+    captured = exif.get_ifd(EXIF_IFD_POINTER).get(EXIF_DATETIME_ORIGINAL_TAG) or exif.get(EXIF_DATETIME_TAG)
+    width, height = img.width, img.height
+    if img.format == "TIFF" and img.tag_v2.get(TIFF_NEW_SUBFILE_TYPE_TAG, 0) & 1:
+        # IFD0 is a reduced-resolution preview (RAW); report the full-size image instead
+        width, height = tiff_full_resolution(data) or (width, height)
+    return {
+        "format": fmt,
+        "width": width,
+        "height": height,
+        "orientation": exif.get(EXIF_ORIENTATION_TAG, 1),
+        "captured": str(captured).strip("\x00 ") if captured else None,
     }
-</style>
-""", unsafe_allow_html=True)
 
-# -----------------------
-# Extract Folder ID
-# -----------------------
-def extract_folder_id(url: str):
-    """Extract folder ID from various Google Drive URL formats"""
-    patterns = [
-        r'/folders/([a-zA-Z0-9_-]+)',
-        r'id=([a-zA-Z0-9_-]+)',
-        r'^([a-zA-Z0-9_-]+)$'
-    ]
-    for p in patterns:
-        m = re.search(p, url)
-        if m:
-            return m.group(1)
-    raise ValueError("Invalid Google Drive folder link.")
+def read_item_header(session, item: dict, api_key: str, length: int):
+    """Fetch the first `length` bytes of an item without downloading the rest"""
+    if item["source"] == "local":
+        with open(item["path"], "rb") as fh:
+            return fh.read(length)
+
+    headers = {"Range": f"bytes=0-{length - 1}"}
+    if api_key:
+        url = f"{DRIVE_API_BASE_URL}/files/{item['file_id']}"
+        params = {"alt": "media"}
+        headers.update(drive_api_headers(api_key))
+    else:
+        url = "https://drive.google.com/uc"
+        params = {"export": "download", "id": item["file_id"]}
+    with session.get(url, params=params, headers=headers, stream=True, timeout=15) as response:
+        response.raise_for_status()
+        # Servers that ignore Range still only get read up to `length`
+        data = b""
+        for chunk in response.iter_content(16 * 1024):
+            data += chunk
+            if len(data) >= length:
+                break
+        return data[:length]
+
+def extract_item_metadata(session, item: dict, api_key: str):
+    """Metadata for one item: Drive manifest fields if present, else a header read"""
+    if item.get("width") and item.get("height"):
+        return {
+            "format": (item.get("mime_type") or "").split("/")[-1].upper() or None,
+            "width": item["width"],
+            "height": item["height"],
+            "orientation": DRIVE_ROTATION_TO_ORIENTATION.get(item.get("rotation") or 0, 1),
+            "captured": item.get("captured"),
+        }
+
+    data = read_item_header(session, item, api_key, HEADER_READ_BYTES)
+    try:
+        return parse_image_header(data)
+    except Exception:
+        if len(data) < HEADER_READ_BYTES:
+            return {"format": detect_media_type(data)[2]}
+    # Header runs past the first read (e.g. a large embedded EXIF thumbnail)
+    data = read_item_header(session, item, api_key, HEADER_RETRY_BYTES)
+    try:
+        return parse_image_header(data)
+    except Exception:
+        return {"format": detect_media_type(data)[2]}
+
+def item_metadata_version(item: dict):
+    """Changes whenever the underlying file changes, so stale rows are re-read"""
+    return str(item.get("md5") or item.get("modified_time") or item.get("size") or "")
+
+def index_catalog_metadata(catalog: dict, api_key: str = "", max_workers: int = 16):
+    """
+    Make sure every catalog entry has a current image_meta row.
+    Returns the number of entries that had to be (re)indexed.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    conn = get_shared_cache_conn()
+    ensure_metadata_table(conn)
+    source = get_catalog_source(catalog)
+    base = dict(catalog, ids=catalog.get("base_ids", catalog["ids"]))
+    ids = base["ids"]
+    items = [resolve_catalog_item(base, pos, source) for pos in range(len(ids))]
+
+    known = {}
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        rows = conn.execute(
+            f"SELECT key, version FROM image_meta WHERE key IN ({','.join('?' * len(chunk))})", chunk
+        ).fetchall()
+        known.update(rows)
+    pending = [item for item in items if known.get(item["file_id"]) != item_metadata_version(item)]
+    if not pending:
+        return 0
+
+    def index_one(item):
+        try:
+            meta = extract_item_metadata(session, item, api_key)
+        except Exception:
+            meta = {}
+        return item, meta
+
+    with requests.Session() as session:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(index_one, pending))
+
+    conn.execute("BEGIN IMMEDIATE")
+    conn.executemany(
+        "INSERT OR REPLACE INTO image_meta (key, version, format, width, height, orientation, captured, size) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [
+            (item["file_id"], item_metadata_version(item), meta.get("format"), meta.get("width"),
+             meta.get("height"), meta.get("orientation"), meta.get("captured"), item.get("size"))
+            for item, meta in results
+        ]
+    )
+    conn.execute("COMMIT")
+    return len(results)
+
+CATALOG_SORTS = {
+    "Name": None,
+    "Capture Date (oldest first)": "m.captured IS NULL, m.captured, c.pos",
+    "Capture Date (newest first)": "m.captured IS NULL, m.captured DESC, c.pos",
+    "Largest First": "m.width IS NULL, m.width * m.height DESC, c.pos",
+    "Smallest First": "m.width IS NULL, m.width * m.height, c.pos",
+}
+
+# Width/height as displayed: EXIF orientations 5-8 are rotated a quarter turn
+DISPLAY_WIDTH_SQL = "CASE WHEN m.orientation BETWEEN 5 AND 8 THEN m.height ELSE m.width END"
+DISPLAY_HEIGHT_SQL = "CASE WHEN m.orientation BETWEEN 5 AND 8 THEN m.width ELSE m.height END"
+CATALOG_ORIENTATIONS = {
+    "All": None,
+    "Landscape": f"{DISPLAY_WIDTH_SQL} > {DISPLAY_HEIGHT_SQL}",
+    "Portrait": f"{DISPLAY_WIDTH_SQL} < {DISPLAY_HEIGHT_SQL}",
+    "Square": f"{DISPLAY_WIDTH_SQL} = {DISPLAY_HEIGHT_SQL}",
+}
+
+def apply_catalog_view(catalog: dict, sort_by: str = "Name", orientation: str = "All", api_key: str = ""):
+    """
+    Reorder and filter a catalog from the metadata index, in place.
+    The unfiltered order is kept in base_ids so views can be changed freely.
+    """
+    catalog.setdefault("base_ids", list(catalog["ids"]))
+    view = (sort_by, orientation)
+    if catalog.get("view", ("Name", "All")) == view:
+        return
+
+    order_sql = CATALOG_SORTS.get(sort_by)
+    where_sql = CATALOG_ORIENTATIONS.get(orientation)
+    if order_sql is None and where_sql is None:
+        ids = list(catalog["base_ids"])
+    else:
+        index_catalog_metadata(catalog, api_key)
+        conn = get_shared_cache_conn()
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS catalog_ids (key TEXT, pos INTEGER)")
+        conn.execute("BEGIN")
+        conn.execute("DELETE FROM catalog_ids")
+        conn.executemany("INSERT INTO catalog_ids (key, pos) VALUES (?, ?)",
+                         ((fid, pos) for pos, fid in enumerate(catalog["base_ids"])))
+        rows = conn.execute(
+            "SELECT c.key FROM catalog_ids c LEFT JOIN image_meta m ON m.key = c.key"
+            + (f" WHERE {where_sql}" if where_sql else "")
+            + f" ORDER BY {order_sql or 'c.pos'}"
+        ).fetchall()
+        conn.execute("DELETE FROM catalog_ids")
+        conn.execute("COMMIT")
+        ids = [row[0] for row in rows]
+
+    catalog["ids"] = ids
+    catalog["view"] = view
+    catalog["pages"] = {}
+    catalog["ids_bytes"] = None
+
+# -----------------------
+# Cacheable Media Server
+# -----------------------
+# Slides are published under the SHA-256 of their bytes and served by a small
+# HTTP server with immutable Cache-Control and ETag/304 support, so browsers and
+# proxies keep them across loops and sessions. Bytes live in the shared cache, so
+# whichever process on the host binds MEDIA_SERVER_PORT can serve every replica.
+MEDIA_SERVER_HOST = os.environ.get("MEDIA_SERVER_HOST", "0.0.0.0")
+# Kept clear of 8501-8600, where Streamlit replicas pick their own ports
+MEDIA_SERVER_PORT = int(os.environ.get("MEDIA_SERVER_PORT", "8765"))
+# Public base URL for media (e.g. a reverse-proxy path). If unset, media is served over
+# plain HTTP on the page's host, which browsers block on HTTPS pages.
+MEDIA_PUBLIC_URL = os.environ.get("MEDIA_PUBLIC_URL", "").rstrip("/")
+# Media URLs are opt-in: set MEDIA_PUBLIC_URL, or MEDIA_URLS=1 when browsers can reach
+# MEDIA_SERVER_PORT on the page's host directly (not the case behind most proxies/containers)
+MEDIA_URLS_ENABLED = bool(MEDIA_PUBLIC_URL) or os.environ.get("MEDIA_URLS", "").lower() in ("1", "true", "yes")
+MEDIA_CACHE_TTL = 30 * 24 * 3600
+MEDIA_MAX_AGE = 365 * 24 * 3600
+MEDIA_BIND_RETRY_SECONDS = 30
+MEDIA_CONTENT_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "GIF": "image/gif", "WEBP": "image/webp",
+                       "BMP": "image/bmp", "SVG": "image/svg+xml", "ICO": "image/x-icon", "AVIF": "image/avif"}
+
+def make_media_handler():
+    """Request handler class serving /media/<sha256>.<ext> from the shared cache"""
+    from http.server import BaseHTTPRequestHandler
+
+    class MediaHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_HEAD(self):
+            self.serve(send_body=False)
+
+        def do_GET(self):
+            self.serve(send_body=True)
+
+        def serve(self, send_body: bool):
+            if self.path == "/media/ping":
+                # Lets other replicas tell this server apart from whatever else holds a port
+                self.send_response(204)
+                self.send_header("X-Slides-Media", "1")
+                self.end_headers()
+                return
+            match = re.fullmatch(r"/media/([0-9a-f]{64})(\.[a-z0-9]+)?", self.path.split("?")[0])
+            if not match:
+                self.send_error(404)
+                return
+            digest = match.group(1)
+            etag = f'"{digest}"'
+            cache_headers = {
+                "ETag": etag,
+                "Cache-Control": f"public, max-age={MEDIA_MAX_AGE}, immutable",
+                "Access-Control-Allow-Origin": "*",
+            }
+
+            # Content never changes for a given hash, so a matching ETag is always fresh
+            if etag in self.headers.get("If-None-Match", ""):
+                self.send_response(304)
+                for name, value in cache_headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                return
+
+            data = resolve_media(digest)
+            if data is None:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", MEDIA_CONTENT_TYPES.get(detect_media_type(data)[2], "application/octet-stream"))
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in cache_headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            if send_body:
+                self.wfile.write(data)
+
+    return MediaHandler
+
+@st.cache_resource
+def get_media_server_state():
+    """Process-wide media server holder"""
+    return {"server": None, "last_attempt": 0.0}
 
-def get_gdrive_image_urls(folder_id: str):
+def ensure_media_server():
     """
-    Extract individual image URLs from a public Google Drive folder.
-    Uses multiple methods to reliably fetch images from public folders.
+    Start the media server in this process if nobody on the host has the port yet.
+    Returns True if some process is expected to be serving media.
     """
-    images = []
-    
+    import threading
+    from http.server import ThreadingHTTPServer
+
+    if MEDIA_SERVER_PORT <= 0:
+        return False
+    state = get_media_server_state()
+    if state["server"] is not None:
+        return True
+    if time.time() - state["last_attempt"] < MEDIA_BIND_RETRY_SECONDS:
+        return state.get("served_elsewhere", False)
+
+    state["last_attempt"] = time.time()
     try:
-        folder_url = f"https://drive.google.com/drive/folders/{folder_id}"
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-        }
-        
-        response = requests.get(folder_url, headers=headers, timeout=15)
-        
-        if response.status_code == 200:
-            html_content = response.text
-            
-            # Method 1: Extract all 33-character file IDs from the page
-            # Google Drive embeds file metadata in JavaScript data structures
-            all_file_ids = re.findall(r'"([a-zA-Z0-9_-]{33})"', html_content)
-            
-            seen = set()
-            for file_id in all_file_ids:
-                if file_id != folder_id and file_id not in seen:
-                    seen.add(file_id)
-                    images.append({
-                        "name": f"Image {len(images)+1}.jpg",
-                        "url": f"https://drive.google.com/uc?export=view&id={file_id}",
-                        "source": "gdrive",
-                        "file_id": file_id
-                    })
-            
-            # Method 2: Also search for 28-character file IDs (alternative format)
-            if len(images) < 50:
-                alt_file_ids = re.findall(r'"([a-zA-Z0-9_-]{28})"', html_content)
-                for file_id in alt_file_ids:
-                    if file_id != folder_id and file_id not in seen and len(file_id) == 28:
-                        seen.add(file_id)
-                        images.append({
-                            "name": f"Image {len(images)+1}.jpg",
-                            "url": f"https://drive.google.com/uc?export=view&id={file_id}",
-                            "source": "gdrive",
-                            "file_id": file_id
-                        })
-            
-            # Method 3: Search for file IDs in data attributes and JSON structures
-            if len(images) < 50:
-                json_pattern = r'\["([a-zA-Z0-9_-]{25,})"'
-                json_ids = re.findall(json_pattern, html_content)
-                for file_id in json_ids:
-                    if file_id != folder_id and file_id not in seen and len(file_id) >= 25:
-                        seen.add(file_id)
-                        images.append({
-                            "name": f"Image {len(images)+1}.jpg",
-                            "url": f"https://drive.google.com/uc?export=view&id={file_id}",
-                            "source": "gdrive",
-                            "file_id": file_id
-                        })
-        
-        if images:
-            st.success(f"✅ Found {len(images)} images in Google Drive folder")
-            return images
-        else:
-            st.warning("⚠️ Could not find images. Please ensure:")
-            st.markdown("""
-            - Folder sharing: "Anyone with the link can view"
-            - Folder contains image files
-            - Use folder ID: `1LfSwuD7WxbS0ZdDeGo0hpiviUx6vMhqs`
-            """)
-        
-        return []
-        
-    except Exception as e:
-        st.error(f"❌ Error loading from Google Drive: {str(e)}")
-        st.info("💡 Try using just the folder ID instead of the full URL")
-        return []
+        server = ThreadingHTTPServer((MEDIA_SERVER_HOST, MEDIA_SERVER_PORT), make_media_handler())
+    except OSError:
+        # Port taken: fine if it's another replica's media server, not some other service
+        state["served_elsewhere"] = probe_media_server()
+        return state["served_elsewhere"]
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="media-server").start()
+    state["server"] = server
+    return True
+
+def probe_media_server():
+    """True if the process holding MEDIA_SERVER_PORT on this host is a media server"""
+    host = "127.0.0.1" if MEDIA_SERVER_HOST in ("", "0.0.0.0", "::") else MEDIA_SERVER_HOST
+    try:
+        response = requests.head(f"http://{host}:{MEDIA_SERVER_PORT}/media/ping", timeout=2)
+    except requests.RequestException:
+        return False
+    return response.status_code == 204 and response.headers.get("X-Slides-Media") == "1"
+
+def media_urls_supported():
+    """
+    Media URLs must be switched on for the deployment, and need a public URL on
+    HTTPS pages since the built-in server is plain HTTP
+    """
+    from urllib.parse import urlparse
+
+    if MEDIA_SERVER_PORT <= 0 or not MEDIA_URLS_ENABLED:
+        return False
+    return bool(MEDIA_PUBLIC_URL) or urlparse(st.context.url or "").scheme != "https"
+
+def get_media_base_url():
+    """Base URL browsers should use for media"""
+    if MEDIA_PUBLIC_URL:
+        return MEDIA_PUBLIC_URL
+    from urllib.parse import urlparse
+
+    host = urlparse(st.context.url or "").hostname or "localhost"
+    return f"http://{host}:{MEDIA_SERVER_PORT}"
+
+def local_media_origin(path: str):
+    """Media origin for a file on disk; it stops resolving once the file changes"""
+    stat = os.stat(path)
+    return {"path": path, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def publish_media_path(data: bytes, origin: dict):
+    """
+    Give bytes a content-hashed path without storing them again. The "media" entry
+    only points at where the bytes already live: a shared-cache entry
+    ({"namespace", "key"}) or a file on disk (local_media_origin).
+    """
+    import hashlib
+    import json
+
+    digest = hashlib.sha256(data).hexdigest()
+    pointer = json.dumps(origin, sort_keys=True).encode()
+    # Pointers are tiny, so compare rather than just check existence: the same bytes
+    # may now live somewhere else (a re-synced file, a rendition under a new key)
+    if shared_cache_get("media", digest) != pointer:
+        shared_cache_put("media", digest, pointer, ttl=MEDIA_CACHE_TTL)
+    ext = (detect_media_type(data)[2] or "bin").lower()
+    return f"/media/{digest}.{ext}"
+
+def resolve_media(digest: str):
+    """Bytes behind a published media hash, or None if its origin is gone or has changed"""
+    import json
+
+    pointer = shared_cache_get("media", digest)
+    if pointer is None:
+        return None
+    try:
+        origin = json.loads(pointer)
+    except ValueError:
+        # Written by an older version that stored the bytes themselves
+        return None
+    if "path" not in origin:
+        return shared_cache_get(origin["namespace"], origin["key"])
+    try:
+        if local_media_origin(origin["path"]) != origin:
+            return None
+        return Path(origin["path"]).read_bytes()
+    except OSError:
+        return None
+
+def publish_media(data: bytes, origin: dict):
+    """Publish bytes (see publish_media_path) and return the stable URL for them"""
+    return get_media_base_url() + publish_media_path(data, origin)
+
+def show_slide_bytes(target, data: bytes, origin: dict, alt: str = ""):
+    """Draw image bytes into a container via a cacheable URL, falling back to st.image"""
+    if use_media_urls and ensure_media_server():
+        target.markdown(f'<img class="slide-image" src="{publish_media(data, origin)}" alt="{html_escape(alt)}">',
+                        unsafe_allow_html=True)
+    else:
+        target.image(data, width="stretch")
 
 # -----------------------
-# Get Public Drive Images
+# Synchronized Channels
 # -----------------------
-def get_public_drive_images(folder_id: str):
+# A channel plays one catalog on a clock shared by every display: the slide index
+# is derived from the channel's epoch and speed, so all sessions (and replicas)
+# agree on it without drifting. A scheduler thread per channel prepares each
+# slide once (single-flight through the shared cache) and prefetches the next.
+# With media URLs, each display reruns once per slide and a small script swaps in
+# the prefetched next slide at the switch time. Otherwise a display polls only
+# until it sees a switch; a full rerun then restarts its fragment timer on that
+# switch, so from there it reruns (and draws) once per slide as well.
+CHANNEL_POLL_SECONDS = float(os.environ.get("CHANNEL_POLL_SECONDS", "0.5"))
+CHANNEL_IDLE_STOP_SECONDS = 60
+# A display timed to the channel clock goes back to polling once its reruns land this late
+CHANNEL_ALIGN_TOLERANCE = 1.0
+
+def save_channel(name: str, catalog: dict, speed: int):
+    """Create or replace a channel playing a catalog from now on"""
+    import json
+
+    epoch = time.time()
+    # Item records travel with the IDs, so replicas that never loaded the folder (or
+    # whose manifest expired) show real names and files rather than placeholders
+    source = get_catalog_source(catalog)
+    records = {fid: source[fid] for fid in catalog["ids"] if fid in source}
+    shared_cache_put("channel_catalog", f"{name}:{epoch}",
+                     json.dumps({"ids": catalog["ids"], "records": records}).encode())
+    definition = {
+        "name": name,
+        "backend": catalog["backend"],
+        "folder_id": catalog["folder_id"],
+        "count": catalog_total(catalog),
+        "speed": speed,
+        "epoch": epoch,
+    }
+    shared_cache_put("channel", name, json.dumps(definition).encode())
+    return definition
+
+def load_channel(name: str):
+    """Current definition of a channel, or None"""
+    import json
+
+    raw = shared_cache_get("channel", name)
+    return json.loads(raw) if raw else None
+
+@st.cache_resource
+def get_channel_registry():
+    """Per-process channel state: catalogs, schedulers and subscribers"""
+    import threading
+
+    return {"channels": {}, "catalogs": {}, "lock": threading.Lock()}
+
+def get_channel_catalog(definition: dict):
+    """Catalog for a channel definition, loaded once per process and epoch"""
+    import json
+
+    registry = get_channel_registry()
+    key = (definition["name"], definition["epoch"])
+    with registry["lock"]:
+        cached = registry["catalogs"].get(key)
+    if cached is None:
+        raw = shared_cache_get("channel_catalog", f"{definition['name']}:{definition['epoch']}") or b"{}"
+        saved = json.loads(raw)
+        cached = build_catalog(definition["backend"], definition["folder_id"], saved.get("ids", []))
+        cached["records"] = saved.get("records", {})
+        cached["records_bytes"] = len(raw)
+        with registry["lock"]:
+            registry["catalogs"] = {k: v for k, v in registry["catalogs"].items() if k[0] != key[0]}
+            registry["catalogs"][key] = cached
+    return cached
+
+def channel_position(definition: dict, now=None):
+    """(slide index, time of the next switch) on the channel clock"""
+    now = time.time() if now is None else now
+    elapsed = max(0.0, now - definition["epoch"])
+    tick = int(elapsed // definition["speed"])
+    index = tick % max(1, definition["count"])
+    next_switch = definition["epoch"] + (tick + 1) * definition["speed"]
+    return index, next_switch
+
+def get_item_display_bytes(item: dict):
+    """Browser-ready (bytes, media origin) for any catalog item; bytes are None on failure"""
+    if item["source"] == "local":
+        if is_heavy_image(item["name"], item.get("size"), HEAVY_DECODE_BYTES):
+            key = local_rendition_key(item["path"], os.stat(item["path"]))
+            return get_local_rendition(item["path"], item["name"]), {"namespace": "rendition", "key": key}
+        origin = local_media_origin(item["path"])
+        return Path(item["path"]).read_bytes(), origin
+    version = item.get("md5") or ""
+    return (get_display_rendition(item["file_id"], version, item["name"]),
+            {"namespace": "rendition", "key": display_rendition_key(item["file_id"], version)})
+
+def prepare_channel_slide(definition: dict, index: int):
     """
-    Get publicly accessible images from Google Drive folder.
-    Works with folders that have 'Anyone with the link can view' permission.
+    Prepare one channel slide and return {"path", "name"} (path is None on failure).
+    The shared-cache lease makes this happen once per channel, not once per display.
+    """
+    import json
+
+    catalog = get_channel_catalog(definition)
+    if not catalog_total(catalog):
+        return {"path": None, "name": ""}
+    item = get_catalog_item(catalog, index)
+
+    def prepare():
+        try:
+            data, origin = get_item_display_bytes(item)
+        except Exception:
+            data = None
+        # Failures aren't cached so the next poll retries
+        return json.dumps({"path": publish_media_path(data, origin), "name": item["name"]}).encode() if data else None
+
+    key = f"{definition['name']}:{definition['epoch']}:{index}"
+    prepared = shared_cache_fetch("channel_asset", key, prepare, ttl=IMAGE_CACHE_TTL)
+    return json.loads(prepared) if prepared else {"path": None, "name": item["name"]}
+
+def run_channel_scheduler(name: str, state: dict):
+    """Keep the current and next slide of a channel prepared until nobody watches it"""
+    while not state["stop"].is_set():
+        definition = load_channel(name)
+        if definition is None:
+            break
+        index, next_switch = channel_position(definition)
+        try:
+            prepare_channel_slide(definition, index)
+            # Prefetch so every display can switch the moment the clock ticks
+            prepare_channel_slide(definition, (index + 1) % max(1, definition["count"]))
+        except Exception as e:
+            state["last_error"] = str(e)
+
+        with state["lock"]:
+            last_seen = max(state["subscribers"].values(), default=0)
+        if time.time() - last_seen > CHANNEL_IDLE_STOP_SECONDS:
+            break
+        state["stop"].wait(max(0.05, next_switch - time.time()))
+
+    # Forget the channel entirely so abandoned names don't accumulate
+    registry = get_channel_registry()
+    with registry["lock"]:
+        state["running"] = False
+        if registry["channels"].get(name) is state:
+            del registry["channels"][name]
+            registry["catalogs"] = {k: v for k, v in registry["catalogs"].items() if k[0] != name}
+
+def subscribe_channel(name: str):
+    """Register this session as a display of a channel, starting its scheduler if needed"""
+    import threading
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    registry = get_channel_registry()
+    with registry["lock"]:
+        state = registry["channels"].get(name)
+        if state is None or not state["running"]:
+            state = {
+                "subscribers": {},
+                "lock": threading.Lock(),
+                "stop": threading.Event(),
+                "running": True,
+                "last_error": None,
+            }
+            registry["channels"][name] = state
+            threading.Thread(target=run_channel_scheduler, args=(name, state), daemon=True,
+                             name=f"channel-{name}").start()
+    ctx = get_script_run_ctx()
+    now = time.time()
+    with state["lock"]:
+        if ctx is not None:
+            state["subscribers"][ctx.session_id] = now
+        # Sessions that stopped polling are no longer subscribers
+        for sid in [sid for sid, seen in state["subscribers"].items() if now - seen > CHANNEL_IDLE_STOP_SECONDS]:
+            del state["subscribers"][sid]
+        return len(state["subscribers"])
+
+def get_channel_frame(name: str, with_next: bool):
+    """What a channel shows now (and next, if asked), or None if it doesn't exist"""
+    definition = load_channel(name)
+    if definition is None:
+        return None
+
+    # Land exactly on a switch that is about to happen instead of one tick late
+    index, next_switch = channel_position(definition)
+    wait = next_switch - time.time()
+    if 0 < wait < CHANNEL_POLL_SECONDS / 2:
+        time.sleep(wait)
+        index, next_switch = channel_position(definition)
+
+    next_index = (index + 1) % max(1, definition["count"])
+    return {
+        "name": name,
+        "epoch": definition["epoch"],
+        "speed": definition["speed"],
+        "total": definition["count"],
+        "index": index,
+        "next_switch": next_switch,
+        "slide": prepare_channel_slide(definition, index),
+        "next_index": next_index,
+        "next": prepare_channel_slide(definition, next_index) if with_next else None,
+        "displays": subscribe_channel(name),
+    }
+
+def channel_caption(frame: dict, slide: dict):
+    """Caption text for a channel slide"""
+    displays = frame["displays"]
+    return f"📺 {frame['name']} · {slide['name']} · {displays} display{'s' if displays != 1 else ''}"
+
+def channel_frame_html(frame: dict):
+    """Current slide markup plus a script that swaps in the next slide at the switch"""
+    import json
+
+    total = frame["total"]
+    base = get_media_base_url()
+    index, slide = frame["index"], frame["slide"]
+    upcoming = None
+    if frame["next"] and frame["next"]["path"]:
+        upcoming = {
+            "src": base + frame["next"]["path"],
+            "alt": frame["next"]["name"],
+            "counter": f"{frame['next_index'] + 1} / {total}",
+            "caption": channel_caption(frame, frame["next"]),
+            "progress": f"{(frame['next_index'] + 1) / total * 100}%",
+        }
+    # Delay relative to the server clock, so the browser's own clock doesn't matter
+    state = json.dumps({"next": upcoming, "delay": (frame["next_switch"] - time.time()) * 1000})
+    # File names must not be able to close the script tag
+    state = state.replace("<", "\\u003c")
+    return f"""
+    <div class="progress-container">
+        <div class="progress-bar" id="channel-progress" style="width: {(index + 1) / total * 100}%"></div>
+    </div>
+    <img class="slide-image" id="channel-image" src="{base}{slide["path"]}" alt="{html_escape(slide["name"])}">
+    <div class="image-caption">
+        <span class="slide-counter" id="channel-counter">{index + 1} / {total}</span>
+        <span id="channel-caption">{html_escape(channel_caption(frame, slide))}</span>
+    </div>
+    <script>
+    (function () {{
+        const state = {state};
+        clearTimeout(window.channelSwitchTimer);
+        if (!state.next) return;
+        new Image().src = state.next.src;
+        window.channelSwitchTimer = setTimeout(function () {{
+            const image = document.getElementById("channel-image");
+            if (!image) return;
+            image.src = state.next.src;
+            image.alt = state.next.alt;
+            document.getElementById("channel-progress").style.width = state.next.progress;
+            document.getElementById("channel-counter").textContent = state.next.counter;
+            document.getElementById("channel-caption").textContent = state.next.caption;
+        }}, Math.max(0, state.delay));
+    }})();
+    </script>
+    """
+
+def channel_timer_key(frame: dict):
+    """Identifies the clock a display's fragment timer was aligned to"""
+    return (frame["name"], frame["epoch"], frame["speed"])
+
+def get_channel_interval(definition, use_script: bool):
+    """Fragment interval for a channel display: one slide when timed to the clock, else a poll"""
+    if definition is None:
+        return CHANNEL_POLL_SECONDS
+    if use_script or st.session_state.get("channel_aligned") == channel_timer_key(definition):
+        return definition["speed"]
+    return CHANNEL_POLL_SECONDS
+
+def align_channel_timer(frame: dict, interval: float):
+    """
+    Without media URLs every slide is drawn by a fragment rerun. Polling displays
+    wait for a switch and then do a full rerun, which restarts the fragment timer at
+    slide length from that moment. Timed displays go back to polling when their
+    reruns drift off the switches (or a full rerun mid-slide restarted the timer).
     """
-    return get_gdrive_image_urls(folder_id)
+    key = channel_timer_key(frame)
+    until_switch = frame["next_switch"] - time.time()
+    since_switch = frame["speed"] - until_switch
+    timed = st.session_state.get("channel_aligned") == key and interval == frame["speed"]
+    if timed:
+        if since_switch > CHANNEL_ALIGN_TOLERANCE:
+            st.session_state.channel_aligned = None
+            rerun()
+    elif frame["speed"] > CHANNEL_POLL_SECONDS and min(until_switch, since_switch) < CHANNEL_POLL_SECONDS:
+        if until_switch < CHANNEL_POLL_SECONDS:
+            # Restart the timer right on the switch: wait out the last poll interval before it
+            time.sleep(max(0.0, until_switch))
+        st.session_state.channel_aligned = key
+        rerun()
+    elif interval != CHANNEL_POLL_SECONDS:
+        # Still timed to a previous broadcast's clock; poll until this one switches
+        st.session_state.channel_aligned = None
+        rerun()
+
+def get_channel_slide_bytes(path: str):
+    """Bytes of a published channel slide, read from the shared cache once per slide per session"""
+    cached = st.session_state.get("channel_slide_bytes")
+    if cached is None or cached[0] != path:
+        cached = (path, resolve_media(path.split("/")[-1].split(".")[0]))
+        st.session_state.channel_slide_bytes = cached
+    return cached[1]
+
+def channel_view(name: str, interval: float):
+    """
+    Show whatever the channel clock says is on screen now. Runs as a fragment
+    every `interval` seconds: the slide duration with media URLs or once timed
+    to the channel clock (see align_channel_timer), a poll otherwise.
+    """
+    use_script = use_media_urls and ensure_media_server()
+    frame = st.session_state.get("channel_frame")
+    stale = frame is None or frame["name"] != name or time.time() >= frame["next_switch"] - CHANNEL_POLL_SECONDS / 2
+    if use_script or stale:
+        frame = get_channel_frame(name, with_next=use_script)
+        st.session_state.channel_frame = frame
+    if frame is None:
+        st.warning(f"⚠️ Channel '{name}' does not exist yet")
+        return
+    if use_script and frame["speed"] != interval:
+        # Re-broadcast at another speed: a full rerun restarts the timer at the new one
+        rerun()
+    if not use_script:
+        align_channel_timer(frame, interval)
+
+    slide, index, total = frame["slide"], frame["index"], frame["total"]
+    if use_script and slide["path"]:
+        st.html(channel_frame_html(frame), unsafe_allow_javascript=True)
+        return
+
+    st.markdown(f"""
+    <div class="progress-container">
+        <div class="progress-bar" style="width: {(index + 1) / total * 100}%"></div>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    data = get_channel_slide_bytes(slide["path"]) if slide["path"] else None
+    if data is not None:
+        st.image(data, width="stretch")
+    else:
+        st.error(f"❌ Unable to load image: {slide['name']}")
+    
+    st.markdown(f"""
+    <div class="image-caption">
+        <span class="slide-counter">{index + 1} / {total}</span>
+        <span>{html_escape(channel_caption(frame, slide))}</span>
+    </div>
+    """, unsafe_allow_html=True)
 
 # -----------------------
 # Initialize Session State
@@ -318,13 +2400,15 @@ if 'current_index' not in st.session_state:
     st.session_state.current_index = 0
 if 'autoplay' not in st.session_state:
     st.session_state.autoplay = False
-if 'images' not in st.session_state:
-    st.session_state.images = []
+if 'catalog' not in st.session_state:
+    st.session_state.catalog = None
 if 'slideshow_speed' not in st.session_state:
     st.session_state.slideshow_speed = 3
 if 'loop_mode' not in st.session_state:
     st.session_state.loop_mode = True
 
+register_session()
+
 # -----------------------
 # Header
 # -----------------------
@@ -349,6 +2433,58 @@ with st.sidebar:
         help="Folder must have 'Anyone with the link can view' permission"
     )
     
+    listing_backend = st.radio(
+        "📡 Listing Backend",
+        ["HTML Scrape", "Drive API v3", "Local Mirror"],
+        help="Drive API v3 returns complete listings with names, types and sizes (needs an API key). "
+             "Local Mirror syncs the folder to disk in the background and plays from the local copy."
+    )
+    
+    drive_api_key = ""
+    full_resync = False
+    mirror_interval = 300
+    if listing_backend in ("Drive API v3", "Local Mirror"):
+        # Never prefilled: a widget default is sent to the browser, password field or not
+        drive_api_key = st.text_input(
+            "🔑 Drive API Key",
+            value="",
+            type="password",
+            help="Leave blank to use the server's DRIVE_API_KEY environment variable or secret"
+        ).strip() or get_drive_api_key()
+        full_resync = st.checkbox(
+            "♻️ Full Resync",
+            value=False,
+            help="Ignore the cached manifest and list the whole folder again. Quick syncs only "
+                 "pick up new or edited files; removals show up after the hourly full listing "
+                 "(DRIVE_API_FULL_SYNC_SECONDS) or a full resync"
+        )
+    if listing_backend == "Local Mirror":
+        mirror_interval = st.slider(
+            "🔄 Sync Interval (seconds)",
+            min_value=30,
+            max_value=3600,
+            value=300,
+            step=30,
+            help="How often the background sync checks Drive for changes"
+        )
+        try:
+            syncer = touch_mirror_syncer(extract_folder_id(folder_url))
+        except ValueError:
+            syncer = None
+        if syncer:
+            if syncer["running"]:
+                st.info("🔄 Sync in progress...")
+            elif syncer["waiting"]:
+                st.info("⏳ Another process is syncing this folder...")
+            elif syncer["last_error"]:
+                st.warning(f"⚠️ Last sync failed: {syncer['last_error']}")
+            elif syncer["last_stats"]:
+                stats = syncer["last_stats"]
+                st.caption(f"Last sync: {stats['downloaded']} downloaded, {stats['deleted']} deleted, "
+                           f"{stats['unchanged']} unchanged, {stats['failed']} failed")
+            if st.button("🔄 Sync Now", use_container_width=True):
+                syncer["trigger"].set()
+    
     st.markdown("---")
     
     st.markdown("## ⚙️ Slideshow Settings")
@@ -371,54 +2507,278 @@ with st.sidebar:
     
     show_info = st.checkbox("ℹ️ Show Image Details", value=True)
     
+    sort_by = st.selectbox(
+        "🗂️ Sort By",
+        list(CATALOG_SORTS),
+        help="Capture date and size come from file headers, indexed once and reused"
+    )
+    orientation_filter = st.radio(
+        "📐 Orientation",
+        list(CATALOG_ORIENTATIONS),
+        horizontal=True
+    )
+    
+    use_media_urls = st.checkbox(
+        "🌐 Cacheable Image URLs",
+        value=media_urls_supported(),
+        disabled=not media_urls_supported(),
+        help=f"Serve slides from content-hashed URLs on port {MEDIA_SERVER_PORT} so browsers and proxies cache them. "
+             "Enabled by the server's MEDIA_PUBLIC_URL (required on HTTPS pages) or MEDIA_URLS=1."
+    )
+    
+    progressive_loading = st.checkbox(
+        "⚡ Progressive Loading",
+        value=True,
+        help="Show a small preview instantly and swap in the full image when it arrives"
+    )
+    
+    collapse_duplicates = st.checkbox(
+        "🧬 Collapse Duplicates",
+        value=False,
+        help="Hash every image's thumbnail and show only one slide per group of near-duplicates"
+    )
+    duplicate_threshold = 6
+    if collapse_duplicates:
+        duplicate_threshold = st.slider(
+            "🎯 Duplicate Sensitivity (bits)",
+            min_value=0,
+            max_value=16,
+            value=6,
+            help="Maximum Hamming distance between perceptual hashes for two images to count as duplicates"
+        )
+    
     st.markdown("---")
     
-    if st.session_state.images:
+    if catalog_total(st.session_state.catalog):
         st.markdown("## 📊 Gallery Stats")
-        total_images = len(st.session_state.images)
-        current_pos = st.session_state.current_index + 1
+        total_images = catalog_total(st.session_state.catalog)
         
+        # Position and progress are shown next to the slide, which updates without a full rerun
         st.metric("Total Items", total_images)
-        st.metric("Current Position", f"{current_pos} of {total_images}")
-        st.progress(current_pos / total_images)
         
         if st.session_state.loop_mode:
             st.success("🔁 Loop Mode: ON")
         else:
             st.info("🔁 Loop Mode: OFF")
+    
+    with st.expander("🧠 Sessions & Memory"):
+        session_report = get_session_report()
+        total_kb = sum(row["Footprint (KB)"] for row in session_report)
+        st.metric("Live Sessions", len(session_report))
+        st.metric("Catalog Memory", f"{total_kb:,.1f} KB of {GLOBAL_MEMORY_BUDGET // 1024 ** 2} MB")
+        st.table(session_report)
+        st.caption("Shared by all sessions")
+        st.table(get_process_state_report())
+    
+    with st.expander("📺 Channel", expanded="channel" in st.query_params):
+        channel_name = st.text_input(
+            "Channel Name",
+            value=st.query_params.get("channel", ""),
+            help="Every display watching a channel shows the same slide, switched by one server clock"
+        ).strip()
+        watch_channel = st.toggle("Watch Channel", value="channel" in st.query_params, disabled=not channel_name)
+        if st.button("📡 Broadcast Gallery", use_container_width=True,
+                     disabled=not (channel_name and catalog_total(st.session_state.catalog))):
+            definition = save_channel(channel_name, st.session_state.catalog, slideshow_speed)
+            st.success(f"✅ Broadcasting {definition['count']} slides to '{channel_name}'")
+        if channel_name:
+            st.caption(f"Join from any display with `?channel={channel_name}`")
+    
+    with st.expander("🔬 Profiling"):
+        st.checkbox(
+            "Enable Profiling",
+            value=profiling_enabled(),
+            key="profiling_enabled",
+            help=f"Record per-rerun timings and memory to {PROFILE_DIR}/ (also enabled by SLIDES_PROFILE=1)"
+        )
+        if profiling_enabled():
+            cprofile_reruns = st.number_input("cProfile reruns", min_value=1, max_value=500, value=20)
+            if st.button("🧪 Sample cProfile", use_container_width=True):
+                if start_cprofile(int(cprofile_reruns)):
+                    st.success(f"✅ Profiling the next {int(cprofile_reruns)} reruns of this session")
+                else:
+                    st.warning("⚠️ Another session is already being sampled")
+            history = st.session_state.get("profile_history", [])
+            if history:
+                st.caption(f"Reports: {PROFILE_DIR.resolve()}")
+                st.table([
+                    {"Rerun": r["rerun"], "Wall (ms)": r["wall_ms"], "Alloc Δ (KB)": r["alloc_delta_kb"],
+                     "Payload (KB)": r["ws_kb"]}
+                    for r in history[-5:]
+                ])
 
 # -----------------------
 # Load Images
 # -----------------------
 if st.button("🚀 Load Gallery", type="primary", use_container_width=True):
     with st.spinner("🔄 Loading images..."):
-        all_images = []
+        catalog = None
         
         # Load Google Drive images
         if folder_url:
             try:
                 folder_id = extract_folder_id(folder_url)
-                gdrive_imgs = get_public_drive_images(folder_id)
-                all_images.extend(gdrive_imgs)
-                st.success(f"✅ Loaded {len(gdrive_imgs)} images from Google Drive")
+                if listing_backend == "Local Mirror":
+                    syncer = start_mirror_syncer(folder_id, drive_api_key, mirror_interval)
+                    if not load_mirror_index(folder_id):
+                        # First run: give the initial sync a head start so there is something to show
+                        deadline = time.time() + MIRROR_FIRST_SYNC_WAIT_SECONDS
+                        while syncer["last_sync"] is None and syncer["thread"].is_alive() and time.time() < deadline:
+                            time.sleep(0.2)
+                        if syncer["last_error"]:
+                            st.error(f"❌ Mirror sync failed: {syncer['last_error']}")
+                        elif syncer["last_sync"] is None:
+                            st.info("🔄 The first sync is still running; reload the gallery to pick up more images")
+                    catalog = build_catalog("mirror", folder_id, get_mirror_file_ids(folder_id))
+                elif listing_backend == "Drive API v3":
+                    file_ids = get_drive_api_file_ids(folder_id, drive_api_key, full=full_resync)
+                    catalog = build_catalog("drive_api", folder_id, file_ids)
+                else:
+                    gdrive_imgs = get_public_drive_images(folder_id)
+                    catalog = build_catalog("scrape", folder_id, [img["file_id"] for img in gdrive_imgs])
+                if collapse_duplicates and catalog_total(catalog) > 1:
+                    with st.spinner("🧬 Checking for near-duplicates..."):
+                        dropped = dedupe_catalog(catalog, threshold=duplicate_threshold)
+                    if dropped:
+                        st.info(f"🧬 Collapsed {dropped} near-duplicate images")
+                with st.spinner("🗂️ Indexing image metadata..."):
+                    apply_catalog_view(catalog, sort_by, orientation_filter, drive_api_key)
+                st.success(f"✅ Loaded {catalog_total(catalog)} images from Google Drive")
             except Exception as e:
                 st.error(f"❌ Error loading Google Drive: {str(e)}")
         else:
             st.error("❌ Please provide a Google Drive folder URL or ID")
         
-        st.session_state.images = all_images
+        st.session_state.catalog = catalog
         st.session_state.current_index = 0
+        st.session_state.slide_shown_at = 0
+        st.session_state.pop("jump_to", None)
+        register_session()
         
-        if all_images:
+        if catalog_total(catalog):
             st.balloons()
 
+# Re-sort / re-filter the loaded catalog when the sidebar view changes
+if st.session_state.catalog and st.session_state.catalog.get("view", ("Name", "All")) != (sort_by, orientation_filter):
+    with st.spinner("🗂️ Indexing image metadata..."):
+        apply_catalog_view(st.session_state.catalog, sort_by, orientation_filter, drive_api_key)
+    st.session_state.current_index = 0
+    st.session_state.pop("jump_to", None)
+    if not catalog_total(st.session_state.catalog):
+        st.warning(f"⚠️ No {orientation_filter.lower()} images in this gallery")
+
 # -----------------------
 # Slideshow Display
 # -----------------------
-if st.session_state.images and st.session_state.current_index < len(st.session_state.images):
-    imgs = st.session_state.images
-    total = len(imgs)
+# Only the slide area is a fragment: autoplay ticks rerun just that fragment, so a
+# slide change sends the stats, image and caption but not the page around them.
+# Controls use callbacks so a click needs a single full rerun.
+def go_to_slide(index: int):
+    """Callback: jump to a slide (clamped to the catalog)"""
+    total = catalog_total(st.session_state.catalog)
+    st.session_state.current_index = min(max(0, index), total - 1)
+    st.session_state.slide_shown_at = time.time()
+
+def step_slide(delta: int):
+    """Callback: move by delta, wrapping around when loop mode is on"""
+    total = catalog_total(st.session_state.catalog)
+    idx = st.session_state.current_index + delta
+    if st.session_state.loop_mode:
+        idx %= total
+    go_to_slide(idx)
+
+def shuffle_slide():
+    """Callback: jump to a random slide"""
+    import random
+    go_to_slide(random.randint(0, catalog_total(st.session_state.catalog) - 1))
+
+def stop_slideshow():
+    """Callback: stop autoplay and return to the first slide"""
+    st.session_state.autoplay = False
+    go_to_slide(0)
+
+def jump_to_input():
+    """Callback for the jump box (1-based); the box is cleared so any number can be typed again"""
+    if st.session_state.jump_to is not None:
+        go_to_slide(int(st.session_state.jump_to) - 1)
+    st.session_state.jump_to = None
+
+def advance_autoplay():
+    """Advance one slide for autoplay; returns False once a non-looping show ends"""
+    idx = st.session_state.current_index
+    total = catalog_total(st.session_state.catalog)
+    # If at last slide, loop back to start if loop mode is on
+    if idx == total - 1 and st.session_state.loop_mode:
+        st.session_state.current_index = 0
+    elif idx < total - 1:
+        st.session_state.current_index = idx + 1
+    else:
+        # At end and no loop - stop autoplay
+        st.session_state.autoplay = False
+        return False
+    return True
+
+def render_slide_image(current_item: dict):
+    """Draw the current slide into the image frame"""
+    if current_item["source"] == "gdrive" and "url" in current_item:
+        file_id = current_item.get("file_id", "")
+        
+        version = current_item.get("md5") or ""
+        frame = st.empty()
+        
+        # Show the low-res preview first; the full image replaces it in the same run
+        if progressive_loading and not has_display_rendition(file_id, version):
+            preview = get_preview_bytes(file_id)
+            if preview:
+                show_slide_bytes(frame, preview, {"namespace": "preview", "key": preview_key(file_id)},
+                                 current_item["name"])
+        
+        # Raw bytes and the decoded rendition are shared by every process on the host
+        rendition = get_display_rendition(file_id, version, current_item["name"])
+        image_loaded = rendition is not None
+        if image_loaded:
+            origin = {"namespace": "rendition", "key": display_rendition_key(file_id, version)}
+            show_slide_bytes(frame, rendition, origin, current_item["name"])
+        
+        if not image_loaded:
+            frame.empty()
+            st.error(f"❌ Unable to load image: {current_item['name']}")
+            st.info(f"💡 File ID: {file_id}")
+            st.markdown(f"[Open in Google Drive](https://drive.google.com/file/d/{file_id}/view)")
+    elif current_item["source"] == "local":
+        # Served from the local mirror; Drive is only touched by the background sync
+        try:
+            # Browsers can't show RAW/HEIC/TIFF, so those arrive as decoded renditions
+            rendition, origin = get_item_display_bytes(current_item)
+            if rendition is None:
+                raise ValueError("could not decode image")
+            show_slide_bytes(st, rendition, origin, current_item["name"])
+        except Exception as e:
+            st.error(f"❌ Unable to load image: {current_item['name']}")
+            st.caption(f"Error: {str(e)}")
+
+@st.fragment(run_every=slideshow_speed if st.session_state.autoplay else None)
+def slide_view():
+    """Stats, image, caption and details for the current slide"""
+    # Fragment-only reruns get their own profile record
+    fragment_run = st.session_state.get("profile_run") is None
+    if fragment_run:
+        start_rerun_profile()
+    
+    # Timer ticks advance the slide; the first draw after a full rerun does not
+    shown_at = st.session_state.get("slide_shown_at", 0)
+    if st.session_state.autoplay and time.time() - shown_at >= slideshow_speed - 0.25:
+        if shown_at and not advance_autoplay():
+            # Show ended: a full rerun updates the Play button and stops the timer
+            rerun()
+    
+    catalog = st.session_state.catalog
+    total = catalog_total(catalog)
     idx = st.session_state.current_index
+    # Autoplay ticks skip the full script, so keep the memory registry current here
+    touch_session()
+    if catalog["backend"] == "mirror":
+        touch_mirror_syncer(catalog["folder_id"])
     
     st.markdown(f"""
     <div class="stats-container">
@@ -443,136 +2803,90 @@ if st.session_state.images and st.session_state.current_index < len(st.session_s
     
     st.markdown('<div class="slideshow-container">', unsafe_allow_html=True)
     
-    current_item = imgs[idx]
+    current_item = get_catalog_item(catalog, idx)
     
     st.markdown('<div class="image-frame">', unsafe_allow_html=True)
-    
-    if current_item["source"] == "gdrive" and "url" in current_item:
-        # Try multiple URL formats for Google Drive
-        file_id = current_item.get("file_id", "")
-        
-        # Try different Google Drive URL formats
-        urls_to_try = [
-            f"https://drive.google.com/uc?export=view&id={file_id}",
-            f"https://lh3.googleusercontent.com/d/{file_id}",
-            f"https://drive.google.com/thumbnail?id={file_id}&sz=w2000",
-            f"https://drive.google.com/uc?export=download&id={file_id}",
-        ]
-        
-        image_loaded = False
-        for url in urls_to_try:
-            try:
-                response = requests.get(url, timeout=10, allow_redirects=True)
-                content_type = response.headers.get('Content-Type', '')
-                
-                if response.status_code == 200 and 'image' in content_type:
-                    from PIL import Image
-                    from io import BytesIO
-                    
-                    img = Image.open(BytesIO(response.content))
-                    st.image(img, width="stretch")
-                    image_loaded = True
-                    break
-            except Exception as e:
-                continue
-        
-        if not image_loaded:
-            st.error(f"❌ Unable to load image: {current_item['name']}")
-            st.info(f"💡 File ID: {file_id}")
-            st.markdown(f"[Open in Google Drive](https://drive.google.com/file/d/{file_id}/view)")
-
+    render_slide_image(current_item)
     st.markdown('</div>', unsafe_allow_html=True)
     
     st.markdown(f"""
     <div class="image-caption">
         <span class="slide-counter">{idx + 1} / {total}</span>
-        <span>☁️ {current_item["name"]}</span>
+        <span>☁️ {html_escape(current_item["name"])}</span>
     </div>
     """, unsafe_allow_html=True)
     
     st.markdown('</div>', unsafe_allow_html=True)
     
+    # Show details in expander to keep view clean
+    if show_info:
+        with st.expander("📋 View Item Details"):
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("Name", current_item["name"])
+            with col2:
+                st.metric("Source", "LOCAL MIRROR" if current_item["source"] == "local" else "GOOGLE DRIVE")
+            with col3:
+                st.metric("Position", f"{idx + 1} of {total}")
+    
+    st.session_state.slide_shown_at = time.time()
+    if fragment_run:
+        finish_rerun_profile()
+
+if channel_name and watch_channel:
+    # With media URLs the browser switches slides itself, so one rerun per slide is enough
+    channel_definition = load_channel(channel_name)
+    channel_interval = get_channel_interval(channel_definition, use_media_urls and ensure_media_server())
+    st.fragment(channel_view, run_every=channel_interval)(channel_name, channel_interval)
+
+elif catalog_total(st.session_state.catalog) and st.session_state.current_index < catalog_total(st.session_state.catalog):
+    total = catalog_total(st.session_state.catalog)
+    
+    slide_view()
+    
     st.markdown("### 🎮 Slideshow Controls")
     col1, col2, col3, col4, col5 = st.columns([1.5, 1, 1, 1, 1.5])
     
     with col1:
-        if st.button("⏮️ First", use_container_width=True):
-            st.session_state.current_index = 0
-            st.rerun()
+        st.button("⏮️ First", use_container_width=True, on_click=go_to_slide, args=(0,))
     
     with col2:
-        if st.button("⬅️ Prev", use_container_width=True):
-            if idx == 0 and st.session_state.loop_mode:
-                st.session_state.current_index = total - 1
-            else:
-                st.session_state.current_index = max(0, idx - 1)
-            st.rerun()
+        st.button("⬅️ Prev", use_container_width=True, on_click=step_slide, args=(-1,))
     
     with col3:
+        # Toggling needs a full rerun to start or stop the fragment timer
         if st.button("⏸️ Pause" if st.session_state.autoplay else "▶️ Play", use_container_width=True, type="primary"):
             st.session_state.autoplay = not st.session_state.autoplay
-            st.rerun()
+            st.session_state.slide_shown_at = time.time()
+            rerun()
     
     with col4:
-        if st.button("➡️ Next", use_container_width=True):
-            if idx == total - 1 and st.session_state.loop_mode:
-                st.session_state.current_index = 0
-            else:
-                st.session_state.current_index = min(total - 1, idx + 1)
-            st.rerun()
+        st.button("➡️ Next", use_container_width=True, on_click=step_slide, args=(1,))
     
     with col5:
-        if st.button("⏭️ Last", use_container_width=True):
-            st.session_state.current_index = total - 1
-            st.rerun()
+        st.button("⏭️ Last", use_container_width=True, on_click=go_to_slide, args=(total - 1,))
     
     col1, col2, col3 = st.columns(3)
     
     with col1:
-        if st.button("🔄 Shuffle", use_container_width=True):
-            import random
-            st.session_state.current_index = random.randint(0, total - 1)
-            st.rerun()
+        st.button("🔄 Shuffle", use_container_width=True, on_click=shuffle_slide)
     
     with col2:
-        if st.button("⏹️ Stop & Reset", use_container_width=True):
-            st.session_state.autoplay = False
-            st.session_state.current_index = 0
-            st.rerun()
+        st.button("⏹️ Stop & Reset", use_container_width=True, on_click=stop_slideshow)
     
     with col3:
-        jump_to = st.selectbox(
+        # A bounded number input keeps the widget payload constant for any folder size
+        st.number_input(
             "Jump to slide:",
-            range(1, total + 1),
-            index=idx,
+            min_value=1,
+            max_value=total,
+            value=None,
+            step=1,
+            placeholder="Jump to slide…",
+            key="jump_to",
+            on_change=jump_to_input,
             label_visibility="collapsed"
         )
-        if jump_to != idx + 1:
-            st.session_state.current_index = jump_to - 1
-            st.rerun()
-    
-    # Show details in expander to keep view clean
-    if show_info:
-        with st.expander("📋 View Item Details"):
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                st.metric("Name", current_item["name"])
-            with col2:
-                st.metric("Source", "GOOGLE DRIVE")
-            with col3:
-                st.metric("Position", f"{idx + 1} of {total}")
-    
-    if st.session_state.autoplay:
-        time.sleep(slideshow_speed)
-        # If at last slide, loop back to start if loop mode is on
-        if idx == total - 1 and st.session_state.loop_mode:
-            st.session_state.current_index = 0
-        elif idx < total - 1:
-            st.session_state.current_index = idx + 1
-        else:
-            # At end and no loop - stop autoplay
-            st.session_state.autoplay = False
-        st.rerun()
 
 else:
     # Welcome screen
@@ -624,3 +2938,5 @@ else:
         </div>
     </div>
     """, unsafe_allow_html=True)
+
+finish_rerun_profile()
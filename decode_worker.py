@@ -0,0 +1,106 @@
+"""
+Image decoding shared by the Streamlit app and its decode process pool.
+
+Kept free of Streamlit imports so pool workers can import it without running
+the app script.
+"""
+import os
+from io import BytesIO
+from pathlib import Path
+
+# Camera RAW formats decoded with rawpy (optional dependency)
+RAW_EXTENSIONS = (
+    '.raw', '.cr2', '.cr3', '.nef', '.orf', '.sr2', '.arw', '.dng',
+    '.rw2', '.raf', '.dcr', '.k25', '.kdc', '.pef', '.srw'
+)
+
+# HEIF-family formats read through pillow-heif (optional dependency)
+HEIF_EXTENSIONS = ('.heic', '.heif', '.avif')
+
+# Formats that are slow to decode or need an optional plugin
+HEAVY_EXTENSIONS = RAW_EXTENSIONS + HEIF_EXTENSIONS + ('.tif', '.tiff', '.exr', '.hdr', '.jp2', '.j2k')
+
+def limit_worker_memory(max_bytes: int):
+    """Pool initializer: cap the worker's address space and Pillow's pixel budget"""
+    from PIL import Image
+
+    # Roughly 4 bytes per pixel for RGBA working copies
+    Image.MAX_IMAGE_PIXELS = max_bytes // 4
+    try:
+        import resource
+        resource.setrlimit(resource.RLIMIT_AS, (max_bytes, max_bytes))
+    except (ImportError, ValueError, OSError):
+        # Not available on this platform; the pixel cap still applies
+        pass
+
+def register_heif_plugin():
+    """Let Image.open read HEIC/HEIF/AVIF through pillow-heif when it is installed"""
+    try:
+        import pillow_heif
+        pillow_heif.register_heif_opener()
+    except ImportError:
+        # Newer Pillow builds may read these natively
+        pass
+
+def open_image(source, name: str = ""):
+    """Open bytes or a file path as a PIL image, using optional plugins when needed"""
+    from PIL import Image
+
+    ext = Path(name or (source if isinstance(source, str) else "")).suffix.lower()
+    if ext in RAW_EXTENSIONS:
+        try:
+            import rawpy
+        except ImportError:
+            raise RuntimeError("rawpy is required to decode camera RAW files")
+        with rawpy.imread(source if isinstance(source, str) else BytesIO(source)) as raw:
+            return Image.fromarray(raw.postprocess(use_camera_wb=True, half_size=True))
+
+    if ext in HEIF_EXTENSIONS:
+        register_heif_plugin()
+
+    return Image.open(source if isinstance(source, str) else BytesIO(source))
+
+def render_display(source, name: str = "", max_edge: int = 2000):
+    """
+    Decode an image (bytes or path) and re-encode a browser-ready rendition.
+    Images with transparency become PNG; everything else becomes JPEG.
+    """
+    from PIL import ImageOps
+
+    img = open_image(source, name)
+    # JPEG can decode straight to a smaller scale
+    img.draft("RGB", (max_edge, max_edge))
+    img = ImageOps.exif_transpose(img)
+    img.thumbnail((max_edge, max_edge))
+
+    out = BytesIO()
+    if img.mode in ('RGBA', 'LA', 'P', 'PA'):
+        img.convert('RGBA').save(out, format="PNG", optimize=True)
+    elif img.mode.startswith('I;16') or img.mode == 'I':
+        # 16-bit TIFFs: scale into 8-bit range before encoding
+        img.convert('I').point(lambda v: v * (1 / 256)).convert('L').save(out, format="JPEG", quality=90)
+    else:
+        img.convert('RGB').save(out, format="JPEG", quality=90)
+    return out.getvalue()
+
+def serve_decode_jobs(conn, max_bytes: int):
+    """
+    Worker process loop: decode one (source, name, max_edge) job at a time from a pipe
+    and reply ("ok", bytes) or ("error", message). Exits when the pipe closes.
+    """
+    limit_worker_memory(max_bytes)
+    while True:
+        try:
+            source, name, max_edge = conn.recv()
+        except EOFError:
+            break
+        try:
+            conn.send(("ok", render_display(source, name, max_edge)))
+        except Exception as e:
+            # Decode errors and MemoryError from the address-space limit
+            conn.send(("error", repr(e)))
+
+def is_heavy_image(name: str = "", size=None, threshold: int = 8 * 1024 * 1024):
+    """Heavy jobs (slow formats or large files) are sent to the process pool"""
+    ext = os.path.splitext(name or "")[1].lower()
+    return ext in HEAVY_EXTENSIONS or (size is not None and size > threshold)
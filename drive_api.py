@@ -0,0 +1,125 @@
+"""
+Google Drive API v3 listing used by the Streamlit app.
+
+Kept free of Streamlit imports so it can be tested against a local stand-in
+server (point DRIVE_API_BASE_URL at it).
+"""
+import os
+import time
+
+import requests
+
+DRIVE_API_BASE_URL = os.environ.get("DRIVE_API_BASE_URL", "https://www.googleapis.com/drive/v3")
+DRIVE_API_PAGE_SIZE = 1000
+DRIVE_API_FIELDS = (
+    "nextPageToken, files(id, name, mimeType, size, modifiedTime, md5Checksum, "
+    "trashed, thumbnailLink, imageMediaMetadata(width, height, rotation, time))"
+)
+# Each MIME type is listed as its own query so pages can be fetched in parallel;
+# the final catch-all partition picks up every other image/* type
+DRIVE_API_MIME_PARTITIONS = ("image/jpeg", "image/png", "image/gif", "image/webp", "image/heif", "image/tiff")
+# Incremental syncs can't see files removed from the folder or moved in with an older
+# modifiedTime, so manifests older than this are relisted in full
+DRIVE_API_FULL_SYNC_SECONDS = int(os.environ.get("DRIVE_API_FULL_SYNC_SECONDS", "3600"))
+
+def drive_api_headers(api_key: str):
+    """Auth headers for Drive API calls; the key stays out of URLs and error messages"""
+    return {"X-Goog-Api-Key": api_key} if api_key else {}
+
+def build_drive_api_queries(folder_id: str, modified_after=None):
+    """Build one files.list query per MIME partition for a folder"""
+    base = f"'{folder_id}' in parents"
+    if modified_after:
+        # Incremental sync also asks for trashed files so removals can be applied
+        base += f" and modifiedTime > '{modified_after}'"
+    else:
+        base += " and trashed = false"
+
+    queries = [f"{base} and mimeType = '{mime}'" for mime in DRIVE_API_MIME_PARTITIONS]
+    others = " and ".join(f"mimeType != '{mime}'" for mime in DRIVE_API_MIME_PARTITIONS)
+    queries.append(f"{base} and mimeType contains 'image/' and {others}")
+    return queries
+
+def fetch_drive_api_query(session, query: str, api_key: str):
+    """Follow nextPageToken for a single files.list query and return all files"""
+    files = []
+    params = {
+        "q": query,
+        "pageSize": DRIVE_API_PAGE_SIZE,
+        "fields": DRIVE_API_FIELDS,
+        "supportsAllDrives": "true",
+        "includeItemsFromAllDrives": "true",
+    }
+
+    while True:
+        response = session.get(f"{DRIVE_API_BASE_URL}/files", params=params, headers=drive_api_headers(api_key),
+                               timeout=30)
+        response.raise_for_status()
+        payload = response.json()
+        files.extend(payload.get("files", []))
+        token = payload.get("nextPageToken")
+        if not token:
+            return files
+        params["pageToken"] = token
+
+def list_drive_api_files(folder_id: str, api_key: str, modified_after=None, max_workers=4):
+    """
+    List image files in a Drive folder through files.list.
+    Partitions are fetched concurrently; each partition pages sequentially.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    queries = build_drive_api_queries(folder_id, modified_after)
+    with requests.Session() as session:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            results = pool.map(lambda q: fetch_drive_api_query(session, q, api_key), queries)
+            files = [f for partition in results for f in partition]
+    return files
+
+def update_drive_manifest(manifest, folder_id: str, api_key: str, full: bool = False):
+    """
+    Bring a manifest ({"files", "watermark", "order", "listed_at"}, or None) up to date
+    and return (manifest, number of changed files). After a full listing only files
+    with a newer modifiedTime are requested, until the listing is
+    DRIVE_API_FULL_SYNC_SECONDS old and is done in full again.
+    """
+    if manifest is not None and time.time() - manifest.get("listed_at", 0) > DRIVE_API_FULL_SYNC_SECONDS:
+        full = True
+
+    if manifest is None or full:
+        files = list_drive_api_files(folder_id, api_key)
+        manifest = {"files": {}, "watermark": None, "order": None, "listed_at": time.time()}
+    else:
+        files = list_drive_api_files(folder_id, api_key, modified_after=manifest["watermark"])
+
+    for f in files:
+        if f.get("trashed"):
+            manifest["files"].pop(f["id"], None)
+        else:
+            manifest["files"][f["id"]] = f
+        modified = f.get("modifiedTime")
+        if modified and (manifest["watermark"] is None or modified > manifest["watermark"]):
+            manifest["watermark"] = modified
+
+    if files:
+        manifest["order"] = None
+    return manifest, len(files)
+
+def drive_file_to_item(f: dict):
+    """Convert a files.list entry to a gallery item"""
+    meta = f.get("imageMediaMetadata") or {}
+    return {
+        "name": f.get("name", f["id"]),
+        "url": f"https://drive.google.com/uc?export=view&id={f['id']}",
+        "source": "gdrive",
+        "file_id": f["id"],
+        "mime_type": f.get("mimeType", ""),
+        "size": int(f["size"]) if f.get("size") else None,
+        "modified_time": f.get("modifiedTime"),
+        "md5": f.get("md5Checksum"),
+        "width": meta.get("width"),
+        "height": meta.get("height"),
+        "thumbnail": f.get("thumbnailLink"),
+        "rotation": meta.get("rotation"),
+        "captured": meta.get("time"),
+    }
@@ -0,0 +1,17 @@
+"""
+Helpers for files served from ./static, shared by app.py and a6pp.py.
+"""
+from pathlib import Path
+
+import streamlit as st
+
+@st.cache_resource
+def get_static_css_tag(css_path: str):
+    """<link> tag for a stylesheet in ./static, or an inline <style> if static serving is off"""
+    import hashlib
+
+    css = Path(css_path).read_text(encoding="utf-8")
+    if not st.get_option("server.enableStaticServing"):
+        return f"<style>\n{css}</style>"
+    digest = hashlib.md5(css.encode()).hexdigest()[:12]
+    return f'<link rel="stylesheet" href="app/static/{Path(css_path).name}?v={digest}">'
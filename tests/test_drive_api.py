@@ -0,0 +1,168 @@
+"""
+drive_api against a local stand-in for the Drive v3 files.list endpoint.
+
+The stub evaluates the query shapes drive_api builds (parents, trashed,
+modifiedTime, mimeType =/!=/contains) and pages results with nextPageToken.
+"""
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import drive_api  # noqa: E402
+
+API_KEY = "test-key"
+
+def matches(f: dict, query: str):
+    """Evaluate a files.list query made of ' and '-joined clauses"""
+    for clause in query.split(" and "):
+        field, op, value = clause.split(" ", 2)
+        if op == "in":
+            if field.strip("'") not in f["parents"]:
+                return False
+        elif field == "trashed":
+            if f.get("trashed", False) != (value == "true"):
+                return False
+        elif field == "modifiedTime":
+            if not f["modifiedTime"] > value.strip("'"):
+                return False
+        elif field == "mimeType":
+            value = value.strip("'")
+            if op == "=" and f["mimeType"] != value:
+                return False
+            if op == "!=" and f["mimeType"] == value:
+                return False
+            if op == "contains" and value not in f["mimeType"]:
+                return False
+        else:
+            raise AssertionError(f"unexpected clause: {clause}")
+    return True
+
+class StubDrive:
+    """In-memory folder plus a log of every files.list request"""
+
+    def __init__(self):
+        self.files = []
+        self.requests = []
+
+    def handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                stub.requests.append({"path": url.path, "params": params,
+                                      "api_key": self.headers.get("X-Goog-Api-Key")})
+                if url.path != "/files":
+                    self.send_error(404)
+                    return
+                found = [f for f in stub.files if matches(f, params["q"])]
+                start = int(params.get("pageToken", 0))
+                size = int(params["pageSize"])
+                payload = {"files": [{k: v for k, v in f.items() if k != "parents"}
+                                     for f in found[start:start + size]]}
+                if start + size < len(found):
+                    payload["nextPageToken"] = str(start + size)
+                body = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+def make_file(n: int, mime: str, modified: str = "2026-01-01T00:00:00.000Z", folder: str = "FOLDER"):
+    return {"id": f"id{n:04d}", "name": f"img{n:04d}", "mimeType": mime, "modifiedTime": modified,
+            "parents": [folder], "trashed": False}
+
+@pytest.fixture
+def stub(monkeypatch):
+    drive = StubDrive()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), drive.handler())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(drive_api, "DRIVE_API_BASE_URL", f"http://127.0.0.1:{server.server_port}")
+    monkeypatch.setattr(drive_api, "DRIVE_API_PAGE_SIZE", 7)
+    yield drive
+    server.shutdown()
+    server.server_close()
+
+def test_lists_every_page_of_every_partition(stub):
+    mimes = ["image/jpeg"] * 20 + ["image/png"] * 9 + ["image/bmp", "image/x-canon-cr2"] + ["image/heif"]
+    stub.files = [make_file(n, mime) for n, mime in enumerate(mimes)]
+    stub.files.append(make_file(900, "image/jpeg", folder="OTHER"))
+    stub.files.append(make_file(901, "video/mp4"))
+    stub.files.append(dict(make_file(902, "image/png"), trashed=True))
+
+    files = drive_api.list_drive_api_files("FOLDER", API_KEY)
+
+    ids = [f["id"] for f in files]
+    assert sorted(ids) == [f"id{n:04d}" for n in range(len(mimes))]
+    assert len(ids) == len(set(ids)), "partitions must not overlap"
+    # 20 JPEGs at 7 per page need three pages
+    jpeg_pages = [r for r in stub.requests if "mimeType = 'image/jpeg'" in r["params"]["q"]]
+    assert [r["params"].get("pageToken") for r in jpeg_pages] == [None, "7", "14"]
+    # One query per MIME partition plus the catch-all
+    assert len({r["params"]["q"] for r in stub.requests}) == len(drive_api.DRIVE_API_MIME_PARTITIONS) + 1
+
+def test_api_key_is_sent_as_header_not_in_url(stub):
+    stub.files = [make_file(0, "image/jpeg")]
+    drive_api.list_drive_api_files("FOLDER", API_KEY)
+    assert all(r["api_key"] == API_KEY for r in stub.requests)
+    assert all("key" not in r["params"] for r in stub.requests)
+
+def test_incremental_sync_applies_changes_and_trashed_files(stub):
+    stub.files = [make_file(n, "image/jpeg") for n in range(10)]
+    manifest, changed = drive_api.update_drive_manifest(None, "FOLDER", API_KEY)
+    assert changed == 10 and len(manifest["files"]) == 10
+    assert manifest["watermark"] == "2026-01-01T00:00:00.000Z"
+
+    later = "2026-02-01T00:00:00.000Z"
+    stub.files[3].update(trashed=True, modifiedTime=later)
+    stub.files[4].update(name="renamed", modifiedTime=later)
+    stub.files.append(make_file(10, "image/png", modified=later))
+    stub.requests.clear()
+    manifest["order"] = ["cached"]
+
+    manifest, changed = drive_api.update_drive_manifest(manifest, "FOLDER", API_KEY)
+
+    assert changed == 3
+    assert "id0003" not in manifest["files"]
+    assert manifest["files"]["id0004"]["name"] == "renamed"
+    assert "id0010" in manifest["files"]
+    assert manifest["watermark"] == later
+    assert manifest["order"] is None
+    # Incremental queries filter on the watermark and include trashed files
+    assert all("modifiedTime > '2026-01-01T00:00:00.000Z'" in r["params"]["q"] for r in stub.requests)
+    assert not any("trashed" in r["params"]["q"] for r in stub.requests)
+
+def test_unchanged_incremental_sync_keeps_order(stub):
+    stub.files = [make_file(n, "image/jpeg") for n in range(3)]
+    manifest, _ = drive_api.update_drive_manifest(None, "FOLDER", API_KEY)
+    manifest["order"] = ["id0000", "id0001", "id0002"]
+    manifest, changed = drive_api.update_drive_manifest(manifest, "FOLDER", API_KEY)
+    assert changed == 0
+    assert manifest["order"] == ["id0000", "id0001", "id0002"]
+
+def test_stale_manifest_is_relisted_in_full(stub):
+    stub.files = [make_file(n, "image/jpeg") for n in range(5)]
+    manifest, _ = drive_api.update_drive_manifest(None, "FOLDER", API_KEY)
+
+    # Removed from the folder without a newer modifiedTime: invisible to incremental sync
+    del stub.files[0]
+    manifest, _ = drive_api.update_drive_manifest(manifest, "FOLDER", API_KEY)
+    assert "id0000" in manifest["files"]
+
+    manifest["listed_at"] -= drive_api.DRIVE_API_FULL_SYNC_SECONDS + 1
+    manifest, changed = drive_api.update_drive_manifest(manifest, "FOLDER", API_KEY)
+    assert changed == 4
+    assert "id0000" not in manifest["files"]